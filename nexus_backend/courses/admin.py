@@ -1,6 +1,10 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from .bundle import clone_course
+from .snapshots import compile_snapshot
+from .static_catalog import on_publish
+from .attempts import refresh_summary
 from .models import (
-    Course, CourseModule, Lesson, Quiz, Question, QuizAttempt,
+    Course, CourseModule, Lesson, Quiz, Question, QuestionPool, QuizAttempt,
     Assignment, Enrollment, LessonProgress, CourseOutcome, CourseRequirement, LessonContent
 )
 
@@ -23,6 +27,7 @@ class LessonInline(admin.TabularInline):
     model = Lesson
     extra = 1
     fields = ('title', 'description', 'position', 'duration')
+    readonly_fields = ('duration',)
     ordering = ('position',)
     show_change_link = True
 
@@ -37,10 +42,15 @@ class QuizInline(admin.TabularInline):
 class QuestionInline(admin.TabularInline):
     model = Question
     extra = 1
-    fields = ('text', 'question_type', 'choices', 'correct_answer', 'points', 'position')
+    fields = ('text', 'question_type', 'choices', 'correct_answer', 'points', 'position', 'pool')
     ordering = ('position',)
     show_change_link = True
 
+class QuestionPoolInline(admin.TabularInline):
+    model = QuestionPool
+    extra = 0
+    fields = ('tag', 'draw')
+
 # Inline for Assignments within a Lesson
 class AssignmentInline(admin.TabularInline):
     model = Assignment
@@ -71,13 +81,30 @@ class CourseAdmin(admin.ModelAdmin):
             'fields': ('price', 'intro_video_id', 'duration', 'rating')
         }),
     )
+    readonly_fields = ('duration',)
     ordering = ('-created_at',)
     list_per_page = 20
+    actions = ['duplicate_courses', 'republish_courses']
+
+    @admin.action(description="Duplicate selected courses")
+    def duplicate_courses(self, request, queryset):
+        for course in queryset.select_related('instructor'):
+            # Copies stay with the original instructor; orphaned courses go to the admin
+            clone_course(course.pk, course.instructor or request.user)
+        self.message_user(request, f"Duplicated {queryset.count()} course(s)", messages.SUCCESS)
+
+    @admin.action(description="Republish selected courses")
+    def republish_courses(self, request, queryset):
+        course_ids = list(queryset.filter(is_published=True).values_list('id', flat=True))
+        for course_id in course_ids:
+            compile_snapshot(course_id)
+            on_publish(course_id)
+        self.message_user(request, f"Republished {len(course_ids)} published course(s)", messages.SUCCESS)
 
 # Admin for CourseModule
 @admin.register(CourseModule)
 class CourseModuleAdmin(admin.ModelAdmin):
-    list_display = ('title', 'course', 'position', 'duration_minutes')
+    list_display = ('title', 'course', 'position', 'duration')
     list_filter = ('course',)
     search_fields = ('title', 'course__title')
     inlines = [LessonInline]
@@ -104,6 +131,7 @@ class LessonAdmin(admin.ModelAdmin):
             'fields': ( 'description','position', 'duration')
         }),
     )
+    readonly_fields = ('duration',)
     ordering = ('course', 'position')
     list_per_page = 20
 
@@ -134,7 +162,7 @@ class QuizAdmin(admin.ModelAdmin):
     list_display = ('title', 'lesson', 'course', 'created_by', 'is_active', 'passing_score', 'max_attempts', 'total_questions')
     list_filter = ('is_active', 'lesson__course', 'created_by')
     search_fields = ('title', 'description', 'lesson__title')
-    inlines = [QuestionInline]
+    inlines = [QuestionPoolInline, QuestionInline]
     fieldsets = (
         ('Basic Information', {
             'fields': ('lesson', 'title', 'description', 'created_by')
@@ -157,7 +185,7 @@ class QuestionAdmin(admin.ModelAdmin):
             'fields': ('quiz', 'text', 'question_type', 'choices', 'correct_answer')
         }),
         ('Additional Info', {
-            'fields': ('explanation', 'points', 'position')
+            'fields': ('explanation', 'points', 'position', 'pool')
         }),
     )
     ordering = ('quiz', 'position')
@@ -188,6 +216,11 @@ class QuizAttemptAdmin(admin.ModelAdmin):
     ordering = ('-started_at',)
     list_per_page = 20
 
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        # Hand-edited attempts bypass the submit path, so resync the student's summary
+        refresh_summary(obj.student_id, obj.quiz_id)
+
 # Admin for Assignment
 @admin.register(Assignment)
 class AssignmentAdmin(admin.ModelAdmin):
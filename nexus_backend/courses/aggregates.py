@@ -0,0 +1,59 @@
+"""
+Denormalized per-course counters and rolled-up durations.
+
+Signal handlers apply deltas with single F() UPDATEs so concurrent writers
+never lose increments. Durations roll up LessonContent -> Lesson ->
+CourseModule -> Course. rebuild_course_aggregates() recomputes everything
+from the source tables with set-based UPDATEs.
+"""
+from django.db.models import Count, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import Course, CourseModule, Lesson, LessonContent, Quiz, Enrollment
+
+
+def adjust_course_aggregates(course_id, **deltas):
+    """Apply counter deltas, e.g. adjust_course_aggregates(1, lesson_count=1)"""
+    changes = {
+        field: Greatest(F(field) + delta, Value(0))
+        for field, delta in deltas.items() if delta
+    }
+    if course_id is not None and changes:
+        Course.objects.filter(pk=course_id).update(**changes)
+
+
+def roll_up_duration(delta, lesson_id=None, module_id=None, course_id=None):
+    """Add a duration delta to the lesson, module and course above a change"""
+    if not delta:
+        return
+    for model, pk in ((Lesson, lesson_id), (CourseModule, module_id), (Course, course_id)):
+        if pk is not None:
+            model.objects.filter(pk=pk).update(duration=Greatest(F('duration') + delta, Value(0)))
+
+
+def _total(queryset, parent, aggregate):
+    return Coalesce(
+        Subquery(
+            queryset.filter(**{parent: OuterRef('pk')}).order_by()
+            .values(parent).annotate(total=aggregate).values('total')
+        ),
+        0,
+    )
+
+
+def rebuild_course_aggregates(courses=None):
+    """Recompute every counter and duration from scratch. Returns the number of courses updated"""
+    courses = Course.objects.all() if courses is None else courses
+    # Bottom up, so each level sums the one just rebuilt
+    Lesson.objects.filter(course__in=courses).update(
+        duration=_total(LessonContent.objects.all(), 'lesson', Sum('duration'))
+    )
+    CourseModule.objects.filter(course__in=courses).update(
+        duration=_total(Lesson.objects.all(), 'module', Sum('duration'))
+    )
+    return courses.update(
+        lesson_count=_total(Lesson.objects.all(), 'course', Count('id')),
+        quiz_count=_total(Quiz.objects.all(), 'course', Count('id')),
+        enrollment_count=_total(Enrollment.objects.all(), 'course', Count('id')),
+        duration=_total(Lesson.objects.all(), 'course', Sum('duration')),
+    )
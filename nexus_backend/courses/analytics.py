@@ -0,0 +1,208 @@
+"""
+Quiz analytics for instructors.
+
+Quiz statistics are database aggregates plus NumPy over values_list() arrays
+of scores and times, cached until another attempt is made (or one deleted).
+Item analysis reads the normalized QuizAttemptAnswer rows. Per-question
+difficulty and answer distributions are grouped SQL; the discrimination index
+and point-biserial correlation are computed with NumPy over an
+(attempt x question) correctness matrix built from values_list(), so no
+attempt or answer objects are ever instantiated.
+"""
+from collections import defaultdict
+
+import numpy as np
+from django.db.models import Avg, Count, Max, Min, Q
+
+from .caching import get_cached_quiz_statistics
+from .grading import get_answer_key
+from .models import Question, QuizAttempt, QuizAttemptAnswer
+
+# Share of attempts in each of the upper and lower groups of the discrimination index (Kelley's 27%)
+GROUP_SHARE = 0.27
+# Percentiles reported for scores and times taken
+PERCENTILES = (10, 25, 50, 75, 90)
+# Scores are bucketed 0-10, 10-20, ... 90-100 (the last bucket includes 100)
+SCORE_BINS = 10
+# Times taken are bucketed into this many equal bins up to the time limit, or the slowest attempt
+TIME_BINS = 10
+# Answers that aren't option labels (short answer, true/false) are listed most common first, up to this many
+TOP_ANSWERS = 10
+
+
+def _number(value, places=4):
+    return round(float(value), places) if value is not None and np.isfinite(float(value)) else None
+
+
+def _column_means(matrix):
+    """Mean of each column over its answered (non-NaN) cells; NaN for columns with none"""
+    answered = ~np.isnan(matrix)
+    counts = answered.sum(axis=0)
+    sums = np.where(answered, matrix, 0.0).sum(axis=0)
+    return np.divide(sums, counts, out=np.full(matrix.shape[1], np.nan), where=counts > 0)
+
+
+def correctness_matrix(quiz, question_ids):
+    """(matrix, totals): 1/0/NaN per attempt and question, and each attempt's score"""
+    rows = np.array(
+        list(QuizAttemptAnswer.objects.filter(attempt__quiz=quiz).values_list('attempt_id', 'question_id', 'is_correct')),
+        dtype=np.int64,
+    ).reshape(-1, 3)
+    question_ids = np.array(question_ids, dtype=np.int64)
+    rows = rows[np.isin(rows[:, 1], question_ids)]
+    attempt_ids, attempt_index = np.unique(rows[:, 0], return_inverse=True)
+    order = np.argsort(question_ids)
+    question_index = order[np.searchsorted(question_ids, rows[:, 1], sorter=order)]
+    matrix = np.full((len(attempt_ids), len(question_ids)), np.nan)
+    matrix[attempt_index, question_index] = rows[:, 2]
+
+    scores = np.array(list(QuizAttempt.objects.filter(quiz=quiz).order_by().values_list('id', 'score')), dtype=float).reshape(-1, 2)
+    scores = scores[np.argsort(scores[:, 0])]
+    totals = scores[np.searchsorted(scores[:, 0], attempt_ids), 1]
+    return matrix, totals
+
+
+def discrimination_index(matrix, totals):
+    """Share correct in the top GROUP_SHARE of attempts minus the share in the bottom, per question"""
+    if len(totals) < 2:
+        return np.full(matrix.shape[1], np.nan)
+    size = max(1, int(round(len(totals) * GROUP_SHARE)))
+    order = np.argsort(totals, kind='stable')
+    return _column_means(matrix[order[-size:]]) - _column_means(matrix[order[:size]])
+
+
+def point_biserial(matrix, totals):
+    """Correlation between answering each question correctly and the attempt's score"""
+    answered = ~np.isnan(matrix)
+    counts = answered.sum(axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        item_means = np.where(answered, matrix, 0.0).sum(axis=0) / counts
+        total_means = np.where(answered, totals[:, None], 0.0).sum(axis=0) / counts
+        item_dev = np.where(answered, matrix - item_means, 0.0)
+        total_dev = np.where(answered, totals[:, None] - total_means, 0.0)
+        return (item_dev * total_dev).sum(axis=0) / np.sqrt((item_dev ** 2).sum(axis=0) * (total_dev ** 2).sum(axis=0))
+
+
+def _distribution(question, entry, counts):
+    """Answer counts for one question: every option for choice questions, the top answers otherwise"""
+    if question['question_type'] not in ('multiple_choice_single', 'multiple_choice_multiple'):
+        given = sorted(((answer, n) for answer, n in counts.items() if answer is not None), key=lambda item: -item[1])
+        return [
+            {'answer': answer, 'count': n, 'is_key': entry is not None and answer == entry.expected}
+            for answer, n in given[:TOP_ANSWERS]
+        ]
+    per_label = defaultdict(int)
+    for answer, n in counts.items():
+        for label in (answer.split(',') if answer else []):
+            per_label[label] += n
+    if entry is None:
+        keys = set()
+    else:
+        keys = entry.expected if isinstance(entry.expected, frozenset) else {entry.expected}
+    return [
+        {'label': chr(65 + index), 'choice': choice, 'count': per_label.get(chr(65 + index), 0), 'is_key': chr(65 + index) in keys}
+        for index, choice in enumerate(question['choices'] or [])
+    ]
+
+
+def item_analysis(quiz):
+    """Difficulty, discrimination, point-biserial and answer distribution for every question of a quiz"""
+    questions = list(Question.objects.filter(quiz=quiz).values('id', 'text', 'question_type', 'choices', 'points'))
+    answers = QuizAttemptAnswer.objects.filter(attempt__quiz=quiz).order_by()
+    totals = {
+        row['question']: row for row in
+        answers.values('question').annotate(responses=Count('id'), correct=Count('id', filter=Q(is_correct=True)))
+    }
+    distributions = defaultdict(dict)
+    for question_id, answer, n in answers.values('question', 'answer').annotate(n=Count('id')).values_list('question', 'answer', 'n'):
+        distributions[question_id][answer] = n
+
+    matrix, scores = correctness_matrix(quiz, [question['id'] for question in questions])
+    discrimination = discrimination_index(matrix, scores)
+    correlation = point_biserial(matrix, scores)
+    key = {entry.id: entry for entry in get_answer_key(quiz)}
+
+    items = []
+    for index, question in enumerate(questions):
+        counts = totals.get(question['id'], {'responses': 0, 'correct': 0})
+        items.append({
+            'question': question['id'],
+            'text': question['text'],
+            'question_type': question['question_type'],
+            'points': question['points'],
+            'responses': counts['responses'],
+            'correct': counts['correct'],
+            'unanswered': distributions[question['id']].get(None, 0),
+            'difficulty': _number(counts['correct'] / counts['responses']) if counts['responses'] else None,
+            'discrimination': _number(discrimination[index]),
+            'point_biserial': _number(correlation[index]),
+            'distribution': _distribution(question, key.get(question['id']), distributions[question['id']]),
+        })
+    return {'quiz': quiz.pk, 'attempts': len(scores), 'items': items}
+
+
+def _percentiles(values):
+    if not len(values):
+        return {str(p): None for p in PERCENTILES}
+    return {str(p): _number(v, 2) for p, v in zip(PERCENTILES, np.percentile(values, PERCENTILES))}
+
+
+def _histogram(values, upper, bins):
+    counts, edges = np.histogram(values, bins=bins, range=(0, upper))
+    return [
+        {'from': _number(low, 2), 'to': _number(high, 2), 'count': int(n)}
+        for low, high, n in zip(edges[:-1], edges[1:], counts)
+    ]
+
+
+def _time_distribution(times, time_limit):
+    """Percentiles and a histogram of seconds taken; attempts over the time limit are counted apart"""
+    upper = time_limit * 60 if time_limit else (times.max() if len(times) else 0)
+    return {
+        'answered': len(times),
+        'percentiles': _percentiles(times),
+        'histogram': _histogram(times[times <= upper], max(upper, 1), TIME_BINS) if len(times) else [],
+        'over_limit': int((times > upper).sum()) if time_limit else 0,
+    }
+
+
+def compile_quiz_statistics(quiz):
+    """Attempts, pass rate, score percentiles and histogram, and the time-taken distribution of a quiz"""
+    attempts = QuizAttempt.objects.filter(quiz=quiz).order_by()
+    summary = attempts.aggregate(
+        attempts=Count('id'), passed=Count('id', filter=Q(passed=True)), students=Count('student', distinct=True),
+        mean=Avg('score'), lowest=Min('score'), highest=Max('score'), mean_time=Avg('time_taken'),
+    )
+    # NULL times come through as NaN and are dropped from the time distribution
+    rows = np.array(list(attempts.values_list('score', 'time_taken')), dtype=float).reshape(-1, 2)
+    scores, times = rows[:, 0], rows[:, 1]
+    times = times[~np.isnan(times)]
+    return {
+        'quiz': quiz.pk,
+        'attempts': summary['attempts'],
+        'students': summary['students'],
+        'passed': summary['passed'],
+        'pass_rate': _number(summary['passed'] / summary['attempts']) if summary['attempts'] else None,
+        'passing_score': quiz.passing_score,
+        'scores': {
+            'mean': _number(summary['mean'], 2),
+            'median': _number(np.median(scores), 2) if len(scores) else None,
+            'std': _number(scores.std(), 2) if len(scores) else None,
+            'min': _number(summary['lowest'], 2),
+            'max': _number(summary['highest'], 2),
+            'percentiles': _percentiles(scores),
+            'histogram': _histogram(scores, 100, SCORE_BINS),
+        },
+        'time_taken': {
+            'mean': _number(summary['mean_time'], 2),
+            **_time_distribution(times, quiz.time_limit),
+        },
+    }
+
+
+def quiz_statistics(quiz):
+    """compile_quiz_statistics(), cached until the quiz's attempts change"""
+    latest = QuizAttempt.objects.filter(quiz=quiz).order_by().aggregate(latest=Max('id'), attempts=Count('id'))
+    return get_cached_quiz_statistics(
+        quiz.pk, latest['latest'] or 0, latest['attempts'], lambda: compile_quiz_statistics(quiz)
+    )
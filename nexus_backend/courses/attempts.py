@@ -0,0 +1,93 @@
+"""
+Per-(student, quiz) attempt summaries.
+
+QuizAttemptSummary holds a student's attempt count, best score, last attempt
+and passed flag for a quiz, so attempt limits and quiz listings read one row
+instead of counting QuizAttempt. A submission claims its attempt with a
+conditional UPDATE (... WHERE attempts_count < max_attempts), which the
+database applies atomically, so concurrent submits can't get past the limit.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import Count, DecimalField, F, Max, Q, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import QuizAttempt, QuizAttemptSummary
+
+
+class AttemptLimitReached(Exception):
+    pass
+
+
+def record_attempt(attempt, max_attempts):
+    """
+    Count a just-created attempt against `max_attempts` and fold its result into
+    the student's summary. Raises AttemptLimitReached when no attempts were left;
+    call it in the transaction that created the attempt so that rolls back too.
+    Returns the student's attempt count, including this one.
+    """
+    score = Value(attempt.score, output_field=DecimalField(max_digits=5, decimal_places=2))
+    changes = {
+        'attempts_count': F('attempts_count') + 1,
+        'best_score': Greatest(Coalesce('best_score', score), score),
+        'last_attempt': attempt,
+    }
+    if attempt.passed:
+        changes['passed'] = True
+    summary = QuizAttemptSummary.objects.filter(student_id=attempt.student_id, quiz_id=attempt.quiz_id)
+    if not summary.filter(attempts_count__lt=max_attempts).update(**changes):
+        if max_attempts < 1:
+            raise AttemptLimitReached
+        try:
+            # First attempt: the unique (student, quiz) row makes concurrent firsts collide here
+            with transaction.atomic():
+                QuizAttemptSummary.objects.create(
+                    student_id=attempt.student_id, quiz_id=attempt.quiz_id, attempts_count=1,
+                    best_score=attempt.score, last_attempt=attempt, passed=attempt.passed,
+                )
+            return 1
+        except IntegrityError:
+            # The row exists: either the limit is reached or another first attempt just created it
+            if not summary.filter(attempts_count__lt=max_attempts).update(**changes):
+                raise AttemptLimitReached
+    return summary.values_list('attempts_count', flat=True).get()
+
+
+def attempts_taken(student, quiz_ids):
+    """{quiz id: attempts} for `student`; quizzes without attempts are left out"""
+    return dict(
+        QuizAttemptSummary.objects.filter(student=student, quiz_id__in=quiz_ids)
+        .values_list('quiz_id', 'attempts_count')
+    )
+
+
+def course_attempts(student, course_id):
+    """
+    ({quiz id: attempts}, fingerprint) for `student`'s quizzes in a course's lessons.
+    The fingerprint (total attempts, latest attempt id) changes with every attempt
+    added or deleted, so it can go in an ETag.
+    """
+    rows = QuizAttemptSummary.objects.filter(student=student, quiz__lesson__course_id=course_id).values_list(
+        'quiz_id', 'attempts_count', 'last_attempt_id'
+    )
+    taken, latest = {}, 0
+    for quiz_id, count, last_attempt_id in rows:
+        taken[quiz_id] = count
+        latest = max(latest, last_attempt_id or 0)
+    return taken, (sum(taken.values()), latest)
+
+
+def refresh_summary(student_id, quiz_id):
+    """Recompute one summary from the attempts themselves, e.g. after an attempt is deleted"""
+    stats = QuizAttempt.objects.filter(student_id=student_id, quiz_id=quiz_id).aggregate(
+        count=Count('id'), best=Max('score'), last=Max('id'), passes=Count('id', filter=Q(passed=True)),
+    )
+    if not stats['count']:
+        QuizAttemptSummary.objects.filter(student_id=student_id, quiz_id=quiz_id).delete()
+        return
+    QuizAttemptSummary.objects.update_or_create(
+        student_id=student_id, quiz_id=quiz_id,
+        defaults={
+            'attempts_count': stats['count'], 'best_score': stats['best'],
+            'last_attempt_id': stats['last'], 'passed': bool(stats['passes']),
+        },
+    )
@@ -0,0 +1,171 @@
+"""
+Course bundles: a whole course tree as JSON lines.
+
+The first line is a header ({"type": "bundle", "version": 1}), then one record
+per row, parents before children:
+
+    {"type": "course", "title": ..., ...}
+    {"type": "module", "ref": 12, "title": ..., "position": ...}
+    {"type": "lesson", "ref": 40, "module": 12, ...}
+
+`ref` is the row's id in the exporting database and child records point at
+their parent's ref, so bundles can be moved between databases. Export streams
+rows with iterator(); import bulk_creates each table inside one transaction.
+"""
+import json
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import transaction
+from rest_framework.exceptions import ValidationError
+
+from .aggregates import rebuild_course_aggregates
+from .models import (
+    Course, CourseModule, Lesson, LessonContent, Resource, Quiz, Question,
+    QuestionPool, Assignment, CourseOutcome, CourseRequirement
+)
+
+BUNDLE_VERSION = 1
+
+# Durations and counters aren't carried; they're rebuilt from the imported rows
+COURSE_FIELDS = ['title', 'description', 'price', 'intro_video_id', 'category']
+
+# (record type, model, {parent field: parent record type}, copied fields), parents first
+TABLES = [
+    ('module', CourseModule, {}, ['title', 'position']),
+    ('lesson', Lesson, {'module': 'module'}, ['title', 'description', 'position']),
+    ('content', LessonContent, {'lesson': 'lesson'}, ['content_type', 'title', 'video_id', 'text_content', 'position', 'duration']),
+    ('resource', Resource, {'lesson': 'lesson'}, ['title', 'url', 'resource_type', 'description', 'position']),
+    ('quiz', Quiz, {'lesson': 'lesson'}, ['title', 'description', 'shuffle_questions', 'time_limit', 'passing_score', 'max_attempts', 'is_active']),
+    ('question', Question, {'quiz': 'quiz'}, ['text', 'question_type', 'choices', 'correct_answer', 'points', 'position', 'explanation', 'pool']),
+    ('pool', QuestionPool, {'quiz': 'quiz'}, ['tag', 'draw']),
+    # Only the stored file name travels; both sides are expected to share media storage
+    ('assignment', Assignment, {'lesson': 'lesson'}, ['title', 'description', 'file', 'due_date']),
+    ('outcome', CourseOutcome, {}, ['text', 'position']),
+    ('requirement', CourseRequirement, {}, ['text', 'position']),
+]
+
+# How each table's rows are reached from the course, for export
+COURSE_LOOKUPS = {
+    CourseModule: 'course_id', Lesson: 'course_id', LessonContent: 'lesson__course_id',
+    Resource: 'lesson__course_id', Quiz: 'lesson__course_id', Question: 'quiz__lesson__course_id',
+    QuestionPool: 'quiz__lesson__course_id',
+    Assignment: 'lesson__course_id', CourseOutcome: 'course_id', CourseRequirement: 'course_id',
+}
+
+
+def _line(record):
+    # str() keeps Decimals exact and datetimes to the microsecond (DjangoJSONEncoder rounds to ms)
+    return json.dumps(record, default=str) + '\n'
+
+
+def export_course(course_id, record_types=None):
+    """Yield the bundle for a course line by line, optionally only some record types"""
+    course = Course.objects.filter(pk=course_id).values(*COURSE_FIELDS).get()
+    yield _line({'type': 'bundle', 'version': BUNDLE_VERSION})
+    yield _line({'type': 'course', **course})
+    for record_type, model, parents, fields in TABLES:
+        if record_types is not None and record_type not in record_types:
+            continue
+        rows = (
+            model.objects.filter(**{COURSE_LOOKUPS[model]: course_id})
+            .order_by('pk').values('pk', *parents, *fields)
+        )
+        for row in rows.iterator(chunk_size=500):
+            row['ref'] = row.pop('pk')
+            yield _line({'type': record_type, **row})
+
+
+def read_bundle(lines):
+    """Parse bundle lines (str or bytes) into (course record, {record type: [records]})"""
+    records = {record_type: [] for record_type, *_ in TABLES}
+    course = None
+    for number, line in enumerate(lines, start=1):
+        if isinstance(line, bytes):
+            line = line.decode('utf-8')
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+            record_type = record.pop('type')
+        except (ValueError, AttributeError, KeyError):
+            raise ValidationError({'bundle': f"Line {number} is not a bundle record"})
+        if number == 1:
+            if record_type != 'bundle' or record.get('version') != BUNDLE_VERSION:
+                raise ValidationError({'bundle': f"Expected a version {BUNDLE_VERSION} bundle header"})
+        elif record_type == 'course':
+            course = record
+        elif record_type in records:
+            records[record_type].append(record)
+        else:
+            raise ValidationError({'bundle': f"Line {number} has unknown record type {record_type!r}"})
+    if course is None:
+        raise ValidationError({'bundle': "Bundle has no course record"})
+    return course, records
+
+
+def clean_row(row, record_type, ref):
+    # Foreign keys are resolved by import_course; checking them here would cost a query per row.
+    # Empty values on fields with a default (e.g. Question.choices == []) are what save() stores too.
+    exclude = [
+        field.name for field in row._meta.fields
+        if field.is_relation or (field.has_default() and getattr(row, field.attname) in field.empty_values)
+    ]
+    try:
+        row.clean_fields(exclude=exclude)
+    except DjangoValidationError as e:
+        label = record_type if ref is None else f"{record_type} {ref}"
+        raise ValidationError({'bundle': {label: e.message_dict}})
+
+
+def import_course(lines, instructor, **overrides):
+    """
+    Create a new, unpublished course for `instructor` from bundle lines. `overrides`
+    replace course fields from the bundle (e.g. title). Returns the Course.
+    """
+    course_data, records = read_bundle(lines)
+    course_data.update(overrides)
+    with transaction.atomic():
+        course = Course(
+            instructor=instructor, is_published=False,
+            **{name: course_data[name] for name in COURSE_FIELDS if name in course_data}
+        )
+        clean_row(course, 'course', None)
+        course.save()
+        new_ids = {}  # record type -> {ref: new pk}
+        for record_type, model, parents, fields in TABLES:
+            rows = []
+            for record in records[record_type]:
+                row = model(**{name: record[name] for name in fields if name in record})
+                for field, parent_type in parents.items():
+                    ref = record.get(field)
+                    if ref is None and model._meta.get_field(field).null:
+                        continue
+                    if ref not in new_ids.get(parent_type, {}):
+                        raise ValidationError({'bundle': f"{record_type} {record.get('ref')} points at unknown {parent_type} {ref}"})
+                    setattr(row, f'{field}_id', new_ids[parent_type][ref])
+                if hasattr(row, 'course_id'):
+                    row.course_id = course.pk
+                if hasattr(row, 'created_by_id'):
+                    row.created_by_id = instructor.pk
+                clean_row(row, record_type, record.get('ref'))
+                rows.append(row)
+            created = model.objects.bulk_create(rows, batch_size=500)
+            new_ids[record_type] = {
+                record.get('ref'): row.pk for record, row in zip(records[record_type], created)
+            }
+        # bulk_create skips the signals that keep the counters and durations up to date. The course is
+        # unpublished, so there's nothing to index until it's published (a normal save).
+        rebuild_course_aggregates(Course.objects.filter(pk=course.pk))
+    course.refresh_from_db()
+    return course
+
+
+# Assignments carry cohort-specific due dates, so clones start without them
+CLONED_TYPES = {'module', 'lesson', 'content', 'resource', 'quiz', 'question', 'pool', 'outcome', 'requirement'}
+
+
+def clone_course(course_id, instructor, title=None):
+    """Copy a course's curriculum into a new unpublished course, through the bundle format in memory"""
+    if title is None:
+        title = f"{Course.objects.values_list('title', flat=True).get(pk=course_id)} (copy)"
+    return import_course(export_course(course_id, CLONED_TYPES), instructor, title=title)
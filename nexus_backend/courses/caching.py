@@ -0,0 +1,78 @@
+from django.core.cache import cache
+from django.db.models import F
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+
+from .models import Course
+
+# Trees are invalidated by version bumps, so the timeout only bounds memory use
+COURSE_TREE_TIMEOUT = 60 * 60 * 24
+
+
+def bump_course_version(course_id):
+    """Roll a child-model change up into the course's content version"""
+    Course.objects.filter(pk=course_id).update(
+        content_version=F('content_version') + 1,
+        content_updated_at=timezone.now(),
+    )
+
+
+def get_cached_course_tree(course_id, version, kind, build):
+    """
+    Read-through cache for serialized course trees.
+    `version` is the course's content_version, `kind` separates different
+    representations of the same course and `build` is only called on a miss.
+    """
+    key = f"course:{course_id}:tree:{kind}:v{version}"
+    data = cache.get(key)
+    if data is None:
+        data = build()
+        cache.set(key, data, COURSE_TREE_TIMEOUT)
+    return data
+
+
+def get_cached_quiz_build(quiz, kind, build):
+    """
+    Read-through cache for data compiled from a quiz and its questions (answer
+    keys, take payloads). Keyed by Quiz.version, which every change bumps.
+    """
+    key = f"quiz:{quiz.pk}:{kind}:v{quiz.version}"
+    data = cache.get(key)
+    if data is None:
+        data = build()
+        cache.set(key, data, COURSE_TREE_TIMEOUT)
+    return data
+
+
+def get_cached_quiz_statistics(quiz_id, latest_attempt, attempts, build):
+    """
+    Read-through cache for a quiz's attempt statistics. Attempts are only added
+    or deleted, so the latest attempt id and the attempt count identify the data.
+    """
+    key = f"quiz:{quiz_id}:stats:a{latest_attempt}:n{attempts}"
+    data = cache.get(key)
+    if data is None:
+        data = build()
+        cache.set(key, data, COURSE_TREE_TIMEOUT)
+    return data
+
+
+def make_etag(*parts):
+    """Strong ETag from version components"""
+    return '"' + '-'.join(str(part) for part in parts) + '"'
+
+
+def not_modified(request, etag, last_modified):
+    """A 304 response if the client's validators still match, otherwise None"""
+    return get_conditional_response(request, etag=etag, last_modified=int(last_modified.timestamp()))
+
+
+def set_validators(response, etag, last_modified, private=False):
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified.timestamp())
+    # Clients may keep the body but must revalidate before reusing it
+    patch_cache_control(response, no_cache=True)
+    if private:
+        patch_cache_control(response, private=True)
+    return response
@@ -0,0 +1,150 @@
+from decimal import Decimal, InvalidOperation
+
+from django.db.models import Case, Count, Q, Value, When, CharField
+from rest_framework.exceptions import ValidationError
+
+# (key, label, min minutes inclusive, max minutes exclusive)
+DURATION_BUCKETS = (
+    ('short', 'Under 1 hour', 0, 60),
+    ('medium', '1-5 hours', 60, 300),
+    ('long', '5-20 hours', 300, 1200),
+    ('extra_long', '20+ hours', 1200, None),
+)
+
+# (key, label, min price inclusive, max price exclusive)
+PRICE_BUCKETS = (
+    ('free', 'Free', Decimal('0'), Decimal('0.01')),
+    ('under_50', 'Under 50', Decimal('0.01'), Decimal('50')),
+    ('50_to_200', '50 - 200', Decimal('50'), Decimal('200')),
+    ('200_plus', '200+', Decimal('200'), None),
+)
+
+RATING_THRESHOLDS = (Decimal('4.5'), Decimal('4.0'), Decimal('3.5'), Decimal('3.0'))
+
+FACETS = ('category', 'price', 'duration', 'rating', 'instructor')
+
+
+def _range_q(field, low, high):
+    q = Q(**{f'{field}__gte': low})
+    if high is not None:
+        q &= Q(**{f'{field}__lt': high})
+    return q
+
+
+def _bucket_case(field, buckets):
+    return Case(
+        *[When(_range_q(field, low, high), then=Value(key)) for key, _, low, high in buckets],
+        output_field=CharField(),
+    )
+
+
+def _csv(value):
+    return [item.strip() for item in value.split(',') if item.strip()] if value else []
+
+
+def _decimal(params, name):
+    value = params.get(name)
+    if value in (None, ''):
+        return None
+    try:
+        return Decimal(value)
+    except InvalidOperation:
+        raise ValidationError({name: "Must be a number"})
+
+
+class CourseCatalogFilter:
+    """
+    Catalog filters parsed from query params, plus facet counts.
+
+    ?category=a,b  ?min_price=&max_price=  ?duration=short,long
+    ?min_rating=4  ?instructor=1,2
+
+    Facet counts are disjunctive: each facet is counted with every filter
+    applied except its own, so the client can show alternative choices.
+    """
+
+    def __init__(self, params):
+        self.categories = _csv(params.get('category'))
+        self.min_price = _decimal(params, 'min_price')
+        self.max_price = _decimal(params, 'max_price')
+        self.min_rating = _decimal(params, 'min_rating')
+        self.durations = _csv(params.get('duration'))
+        valid_durations = {key for key, *_ in DURATION_BUCKETS}
+        if any(d not in valid_durations for d in self.durations):
+            raise ValidationError({'duration': f"Choose from {', '.join(sorted(valid_durations))}"})
+        try:
+            self.instructors = [int(i) for i in _csv(params.get('instructor'))]
+        except ValueError:
+            raise ValidationError({'instructor': "Must be a comma separated list of ids"})
+
+    def filters(self, exclude=None):
+        q = Q()
+        if self.categories and exclude != 'category':
+            q &= Q(category__in=self.categories)
+        if exclude != 'price':
+            if self.min_price is not None:
+                q &= Q(price__gte=self.min_price)
+            if self.max_price is not None:
+                q &= Q(price__lte=self.max_price)
+        if self.durations and exclude != 'duration':
+            duration_q = Q()
+            for key, _, low, high in DURATION_BUCKETS:
+                if key in self.durations:
+                    duration_q |= _range_q('duration', low, high)
+            q &= duration_q
+        if self.min_rating is not None and exclude != 'rating':
+            q &= Q(rating__gte=self.min_rating)
+        if self.instructors and exclude != 'instructor':
+            q &= Q(instructor_id__in=self.instructors)
+        return q
+
+    def apply(self, queryset):
+        return queryset.filter(self.filters())
+
+    def facet_counts(self, queryset):
+        """One grouped aggregate query per facet"""
+        categories = (
+            queryset.filter(self.filters(exclude='category'))
+            .values('category').annotate(count=Count('id')).order_by('-count', 'category')
+        )
+        prices = dict(
+            queryset.filter(self.filters(exclude='price'))
+            .annotate(bucket=_bucket_case('price', PRICE_BUCKETS))
+            .values('bucket').annotate(count=Count('id')).values_list('bucket', 'count')
+        )
+        durations = dict(
+            queryset.filter(self.filters(exclude='duration'))
+            .annotate(bucket=_bucket_case('duration', DURATION_BUCKETS))
+            .values('bucket').annotate(count=Count('id')).values_list('bucket', 'count')
+        )
+        ratings = queryset.filter(self.filters(exclude='rating')).aggregate(**{
+            str(threshold): Count('id', filter=Q(rating__gte=threshold)) for threshold in RATING_THRESHOLDS
+        })
+        instructors = (
+            queryset.filter(self.filters(exclude='instructor'))
+            .values('instructor_id', 'instructor__first_name', 'instructor__last_name')
+            .annotate(count=Count('id')).order_by('-count', 'instructor_id')
+        )
+        return {
+            'category': [
+                {'value': row['category'], 'count': row['count']} for row in categories
+            ],
+            'price': [
+                {'value': key, 'label': label, 'count': prices.get(key, 0)} for key, label, *_ in PRICE_BUCKETS
+            ],
+            'duration': [
+                {'value': key, 'label': label, 'count': durations.get(key, 0)} for key, label, *_ in DURATION_BUCKETS
+            ],
+            'rating': [
+                {'value': str(threshold), 'label': f"{threshold} & up", 'count': ratings[str(threshold)]}
+                for threshold in RATING_THRESHOLDS
+            ],
+            'instructor': [
+                {
+                    'value': row['instructor_id'],
+                    'label': f"{row['instructor__first_name']} {row['instructor__last_name']}".strip(),
+                    'count': row['count'],
+                }
+                for row in instructors
+            ],
+        }
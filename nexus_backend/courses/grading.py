@@ -0,0 +1,138 @@
+"""
+Quiz grading against compiled answer keys.
+
+A quiz's questions are compiled into an immutable answer key once per
+Quiz.version (bumped whenever the quiz or a question changes, see signals.py)
+and cached, so grading a submission reads no Question rows and is one pass
+over the key.
+"""
+import ast
+import json
+from decimal import Decimal, ROUND_HALF_UP
+from typing import NamedTuple
+
+from .caching import get_cached_quiz_build
+from .models import Question, QuizAttemptAnswer
+
+
+class KeyEntry(NamedTuple):
+    id: int
+    points: int
+    question_type: str
+    expected: object  # frozenset of labels, a normalized string, or the exact answer
+    text: str
+    correct_answer: str  # as stored, for the results shown to the student
+    explanation: str
+
+
+class Grade(NamedTuple):
+    earned_points: int
+    total_points: int
+    correct_answers: int
+    results: dict  # {question id: detailed result}
+
+    @property
+    def score(self):
+        """Percentage, rounded to the 2 places QuizAttempt.score stores"""
+        if not self.total_points:
+            return Decimal('0.00')
+        return (Decimal(self.earned_points * 100) / self.total_points).quantize(Decimal('0.01'), ROUND_HALF_UP)
+
+
+def normalize_text(value):
+    return value.strip().casefold()
+
+
+def parse_answer_list(value):
+    """Labels of a multiple-answer question; stored as JSON, or as a Python repr when a list was saved as-is"""
+    if isinstance(value, list):
+        return value
+    try:
+        parsed = json.loads(value)
+    except ValueError:
+        try:
+            parsed = ast.literal_eval(value)
+        except (ValueError, SyntaxError):
+            parsed = [value]
+    return parsed if isinstance(parsed, list) else [parsed]
+
+
+def _expected(question_type, correct_answer):
+    if question_type == 'multiple_choice_multiple':
+        return frozenset(parse_answer_list(correct_answer))
+    if question_type == 'short_answer':
+        return normalize_text(correct_answer)
+    return correct_answer
+
+
+def compile_answer_key(quiz_id):
+    """The answer key of a quiz as a tuple of KeyEntry, in question order"""
+    rows = Question.objects.filter(quiz_id=quiz_id).values_list(
+        'id', 'points', 'question_type', 'correct_answer', 'text', 'explanation'
+    )
+    return tuple(
+        KeyEntry(pk, points, question_type, _expected(question_type, correct_answer), text, correct_answer, explanation)
+        for pk, points, question_type, correct_answer, text, explanation in rows
+    )
+
+
+def get_answer_key(quiz):
+    """The compiled answer key of a quiz, cached per version"""
+    return get_cached_quiz_build(quiz, 'answer-key', lambda: compile_answer_key(quiz.pk))
+
+
+def is_correct(entry, answer):
+    if entry.question_type == 'multiple_choice_multiple':
+        return isinstance(answer, list) and all(isinstance(label, str) for label in answer) \
+            and frozenset(answer) == entry.expected
+    if entry.question_type == 'short_answer':
+        return isinstance(answer, str) and normalize_text(answer) == entry.expected
+    return answer == entry.expected
+
+
+def stored_answer(entry, answer):
+    """An answer as kept in QuizAttemptAnswer.answer: labels sorted and comma-joined, text normalized"""
+    if answer is None:
+        return None
+    if entry.question_type == 'multiple_choice_multiple' and isinstance(answer, list):
+        value = ','.join(sorted({str(label) for label in answer}))
+    elif entry.question_type == 'short_answer' and isinstance(answer, str):
+        value = normalize_text(answer)
+    elif isinstance(answer, str):
+        value = answer
+    else:
+        value = json.dumps(answer)
+    return value[:255]
+
+
+def answer_rows(attempt, answer_key, graded):
+    """Unsaved QuizAttemptAnswer rows for a graded attempt, one per question in the key"""
+    return [
+        QuizAttemptAnswer(
+            attempt=attempt, question_id=entry.id,
+            answer=stored_answer(entry, graded.results[entry.id]['your_answer']),
+            is_correct=graded.results[entry.id]['is_correct'],
+        )
+        for entry in answer_key
+    ]
+
+
+def grade(answer_key, answers):
+    """Grade `answers` ({question id as str: answer}) against an answer key"""
+    earned = total = correct_count = 0
+    results = {}
+    for entry in answer_key:
+        answer = answers.get(str(entry.id))
+        correct = is_correct(entry, answer)
+        if correct:
+            earned += entry.points
+            correct_count += 1
+        total += entry.points
+        results[entry.id] = {
+            'question': entry.text,
+            'your_answer': answer,
+            'correct_answer': entry.correct_answer,
+            'is_correct': correct,
+            'explanation': entry.explanation,
+        }
+    return Grade(earned, total, correct_count, results)
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from courses.static_catalog import sync_catalog
+
+
+class Command(BaseCommand):
+    help = "Write the public course list and published course details as gzipped static JSON"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--root', help="Output directory (defaults to STATIC_CATALOG_ROOT)")
+        parser.add_argument('--force', action='store_true', help="Rewrite every file, ignoring the manifest")
+
+    def handle(self, *args, **options):
+        written, removed = sync_catalog(root=options['root'], force=options['force'])
+        self.stdout.write(self.style.SUCCESS(f"Wrote {written} course files, removed {removed}"))
@@ -0,0 +1,26 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from courses.bundle import export_course
+from courses.models import Course
+
+
+class Command(BaseCommand):
+    help = "Write a course and its whole curriculum as a JSON lines bundle"
+
+    def add_arguments(self, parser):
+        parser.add_argument('course_id', type=int)
+        parser.add_argument('-o', '--output', help="File to write (default: stdout)")
+
+    def handle(self, *args, **options):
+        if not Course.objects.filter(pk=options['course_id']).exists():
+            raise CommandError(f"Course {options['course_id']} does not exist")
+        out = open(options['output'], 'w', encoding='utf-8') if options['output'] else sys.stdout
+        try:
+            out.writelines(export_course(options['course_id']))
+        finally:
+            if out is not sys.stdout:
+                out.close()
+        if options['output']:
+            self.stdout.write(self.style.SUCCESS(f"Exported course {options['course_id']} to {options['output']}"))
@@ -0,0 +1,28 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.exceptions import ValidationError
+
+from courses.bundle import import_course
+
+
+class Command(BaseCommand):
+    help = "Create a new unpublished course from a JSON lines bundle"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--instructor', required=True, help="Username of the new course's instructor")
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        try:
+            instructor = User.objects.get(username=options['instructor'])
+        except User.DoesNotExist:
+            raise CommandError(f"No user named {options['instructor']}")
+        try:
+            with open(options['path'], encoding='utf-8') as bundle:
+                course = import_course(bundle, instructor)
+        except ValidationError as e:
+            raise CommandError(f"Invalid bundle: {e.detail}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported course {course.pk} ({course.lesson_count} lessons, {course.quiz_count} quizzes)"
+        ))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.exceptions import ValidationError
+
+from courses.models import Quiz
+from courses.question_import import FORMATS, guess_format, import_questions, parse_questions
+
+
+class Command(BaseCommand):
+    help = "Add the questions of a CSV, JSON or GIFT question bank to a quiz"
+
+    def add_arguments(self, parser):
+        parser.add_argument('quiz_id', type=int)
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=FORMATS, help="Bank format (defaults to the file extension; .txt is GIFT)")
+
+    def handle(self, *args, **options):
+        try:
+            quiz = Quiz.objects.get(pk=options['quiz_id'])
+        except Quiz.DoesNotExist:
+            raise CommandError(f"No quiz {options['quiz_id']}")
+        try:
+            with open(options['path'], 'rb') as bank:
+                rows = parse_questions(bank.read(), options['format'] or guess_format(options['path']))
+            created = import_questions(quiz, rows)
+        except ValidationError as e:
+            raise CommandError(f"Invalid question bank: {e.detail}")
+        self.stdout.write(self.style.SUCCESS(f"Imported {len(created)} questions into quiz {quiz.pk}"))
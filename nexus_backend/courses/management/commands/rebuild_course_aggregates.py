@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from courses.aggregates import rebuild_course_aggregates
+from courses.models import Course
+
+
+class Command(BaseCommand):
+    help = "Recompute course counters and the rolled-up lesson, module and course durations"
+
+    def add_arguments(self, parser):
+        parser.add_argument('course_ids', nargs='*', type=int, help="Only rebuild these courses")
+
+    def handle(self, *args, **options):
+        courses = Course.objects.all()
+        if options['course_ids']:
+            courses = courses.filter(pk__in=options['course_ids'])
+        count = rebuild_course_aggregates(courses)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt aggregates for {count} courses"))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from courses.snapshots import rebuild_snapshots
+
+
+class Command(BaseCommand):
+    help = "Recompile the public snapshots of every published course"
+
+    def handle(self, *args, **options):
+        count = rebuild_snapshots()
+        self.stdout.write(self.style.SUCCESS(f"Compiled {count} course snapshots"))
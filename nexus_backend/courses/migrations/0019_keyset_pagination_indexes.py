@@ -0,0 +1,43 @@
+# Generated by Django 5.1.7 on 2026-10-17 02:56
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0018_resource'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='course',
+            index=models.Index(fields=['is_published', '-created_at', '-id'], name='courses_cou_is_publ_d639ce_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='course',
+            index=models.Index(fields=['instructor', '-created_at', '-id'], name='courses_cou_instruc_b43821_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='enrollment',
+            index=models.Index(fields=['course', '-enrolled_at', '-id'], name='courses_enr_course__b84680_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='quiz',
+            index=models.Index(fields=['course', '-created_at', '-id'], name='courses_qui_course__211558_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='quiz',
+            index=models.Index(fields=['lesson', '-created_at', '-id'], name='courses_qui_lesson__9a3966_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='quizattempt',
+            index=models.Index(fields=['student', '-started_at', '-id'], name='courses_qui_student_d30bf1_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='quizattempt',
+            index=models.Index(fields=['quiz', 'student', '-started_at', '-id'], name='courses_qui_quiz_id_6c670e_idx'),
+        ),
+    ]
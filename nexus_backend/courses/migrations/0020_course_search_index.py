@@ -0,0 +1,52 @@
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE courses_course_search USING fts5("
+            "title, description, category, outcomes, lessons, tokenize='porter unicode61')"
+        )
+        schema_editor.execute(
+            "INSERT INTO courses_course_search (rowid, title, description, category, outcomes, lessons) "
+            "SELECT c.id, c.title, c.description, COALESCE(c.category, ''), "
+            "COALESCE((SELECT group_concat(o.text, ' ') FROM courses_courseoutcome o WHERE o.course_id = c.id), ''), "
+            "COALESCE((SELECT group_concat(l.title, ' ') FROM courses_lesson l WHERE l.course_id = c.id), '') "
+            "FROM courses_course c WHERE c.is_published"
+        )
+    elif vendor == 'postgresql':
+        schema_editor.execute(
+            "CREATE TABLE courses_course_search ("
+            "course_id bigint PRIMARY KEY REFERENCES courses_course (id) ON DELETE CASCADE, "
+            "document tsvector NOT NULL)"
+        )
+        schema_editor.execute(
+            "CREATE INDEX courses_course_search_document_idx ON courses_course_search USING GIN (document)"
+        )
+        schema_editor.execute(
+            "INSERT INTO courses_course_search (course_id, document) "
+            "SELECT c.id, "
+            "setweight(to_tsvector('english', c.title), 'A') || "
+            "setweight(to_tsvector('english', COALESCE(c.category, '')), 'A') || "
+            "setweight(to_tsvector('english', COALESCE((SELECT string_agg(o.text, ' ') FROM courses_courseoutcome o WHERE o.course_id = c.id), '')), 'B') || "
+            "setweight(to_tsvector('english', COALESCE((SELECT string_agg(l.title, ' ') FROM courses_lesson l WHERE l.course_id = c.id), '')), 'C') || "
+            "setweight(to_tsvector('english', c.description), 'D') "
+            "FROM courses_course c WHERE c.is_published"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor in ('sqlite', 'postgresql'):
+        schema_editor.execute("DROP TABLE IF EXISTS courses_course_search")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0019_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.1.7 on 2026-10-17 03:02
+
+from django.db import migrations, models
+from django.db.models import Count, F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def backfill_aggregates(apps, schema_editor):
+    Course = apps.get_model('courses', 'Course')
+
+    def per_course(model_name, aggregate, **annotations):
+        queryset = apps.get_model('courses', model_name).objects.annotate(**annotations)
+        return Coalesce(Subquery(
+            queryset.filter(course=OuterRef('pk')).order_by()
+            .values('course').annotate(total=aggregate).values('total')
+        ), 0)
+
+    Course.objects.update(
+        lesson_count=per_course('Lesson', Count('id')),
+        quiz_count=per_course('Quiz', Count('id')),
+        enrollment_count=per_course('Enrollment', Count('id')),
+        content_duration=per_course('LessonContent', Sum('duration'), course=F('lesson__course')),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0021_course_content_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='content_duration',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Sum of lesson content durations in minutes'),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='enrollment_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='lesson_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='quiz_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_aggregates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.1.7 on 2026-10-17 03:18
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def backfill_durations(apps, schema_editor):
+    LessonContent = apps.get_model('courses', 'LessonContent')
+    Lesson = apps.get_model('courses', 'Lesson')
+    CourseModule = apps.get_model('courses', 'CourseModule')
+    Course = apps.get_model('courses', 'Course')
+
+    def total(model, parent):
+        return Coalesce(Subquery(
+            model.objects.filter(**{parent: OuterRef('pk')}).order_by()
+            .values(parent).annotate(total=Sum('duration')).values('total')
+        ), 0)
+
+    # Bottom up: hand-entered lesson/course durations are replaced by their contents' totals
+    Lesson.objects.update(duration=total(LessonContent, 'lesson'))
+    CourseModule.objects.update(duration=total(Lesson, 'module'))
+    Course.objects.update(duration=total(Lesson, 'course'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0022_course_aggregates'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='course',
+            name='content_duration',
+        ),
+        migrations.AddField(
+            model_name='coursemodule',
+            name='duration',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Sum of lesson durations in minutes'),
+        ),
+        migrations.AlterField(
+            model_name='course',
+            name='duration',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Duration in minutes'),
+        ),
+        migrations.AlterField(
+            model_name='lesson',
+            name='duration',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Sum of content durations in minutes'),
+        ),
+        migrations.RunPython(backfill_durations, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.1.7 on 2026-10-17 03:22
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0023_rolled_up_durations'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CourseSnapshot',
+            fields=[
+                ('course', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='snapshot', serialize=False, to='courses.course')),
+                ('document', models.JSONField()),
+                ('content_hash', models.CharField(max_length=64)),
+                ('content_version', models.PositiveIntegerField(help_text='Course content version the document was compiled from')),
+                ('compiled_at', models.DateTimeField()),
+            ],
+        ),
+    ]
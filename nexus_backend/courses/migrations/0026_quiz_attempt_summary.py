@@ -0,0 +1,49 @@
+# Generated by Django 5.1.7 on 2026-10-17 03:31
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Max, Q
+
+
+def backfill_summaries(apps, schema_editor):
+    QuizAttempt = apps.get_model('courses', 'QuizAttempt')
+    QuizAttemptSummary = apps.get_model('courses', 'QuizAttemptSummary')
+    groups = (
+        QuizAttempt.objects.order_by().values('student', 'quiz')
+        .annotate(count=Count('id'), best=Max('score'), last=Max('id'), passes=Count('id', filter=Q(passed=True)))
+    )
+    QuizAttemptSummary.objects.bulk_create([
+        QuizAttemptSummary(
+            student_id=group['student'], quiz_id=group['quiz'], attempts_count=group['count'],
+            best_score=group['best'], last_attempt_id=group['last'], passed=bool(group['passes']),
+        )
+        for group in groups.iterator()
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0025_quiz_version'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuizAttemptSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('attempts_count', models.PositiveIntegerField(default=0)),
+                ('best_score', models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True)),
+                ('passed', models.BooleanField(default=False)),
+                ('last_attempt', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='courses.quizattempt')),
+                ('quiz', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attempt_summaries', to='courses.quiz')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='quiz_attempt_summaries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('student', 'quiz')},
+            },
+        ),
+        migrations.RunPython(backfill_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.1.7 on 2026-10-17 03:35
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0026_quiz_attempt_summary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuizAttemptAnswer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('answer', models.CharField(blank=True, max_length=255, null=True)),
+                ('is_correct', models.BooleanField(default=False)),
+                ('attempt', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='graded_answers', to='courses.quizattempt')),
+                ('question', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attempt_answers', to='courses.question')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['question', 'is_correct'], name='courses_qui_questio_e286c7_idx'), models.Index(fields=['question', 'answer'], name='courses_qui_questio_9080c9_idx')],
+            },
+        ),
+    ]
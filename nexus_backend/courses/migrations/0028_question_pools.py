@@ -0,0 +1,32 @@
+# Generated by Django 5.1.7 on 2026-10-17 03:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0027_quiz_attempt_answer'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='question',
+            name='pool',
+            field=models.CharField(blank=True, help_text='Tag of the question pool this question is drawn from', max_length=50),
+        ),
+        migrations.CreateModel(
+            name='QuestionPool',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tag', models.CharField(max_length=50)),
+                ('draw', models.PositiveIntegerField(help_text='Number of questions drawn from the pool for each attempt')),
+                ('quiz', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pools', to='courses.quiz')),
+            ],
+            options={
+                'ordering': ['tag'],
+                'unique_together': {('quiz', 'tag')},
+            },
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.1.7 on 2026-10-17 05:10
+
+from django.db import migrations
+
+
+def drop_snapshots(apps, schema_editor):
+    # Snapshots compiled so far embed the answer keys; the public detail view and
+    # sync_catalog recompile missing snapshots without them
+    apps.get_model('courses', 'CourseSnapshot').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0028_question_pools'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_snapshots, migrations.RunPython.noop),
+    ]
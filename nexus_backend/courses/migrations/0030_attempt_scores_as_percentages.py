@@ -0,0 +1,53 @@
+# Generated by Django 5.1.7 on 2026-10-17 05:20
+
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.db import migrations
+from django.db.models import Count, Max, Q, Sum
+
+
+def scores_to_percentages(apps, schema_editor):
+    """
+    Attempts graded by the old submit view stored the raw points as score and left total_points
+    at 0 (a quiz without questions can't be submitted, so newer rows always have a
+    total). Convert them against the quiz's current total points, like grading does.
+    """
+    Question = apps.get_model('courses', 'Question')
+    QuizAttempt = apps.get_model('courses', 'QuizAttempt')
+    QuizAttemptSummary = apps.get_model('courses', 'QuizAttemptSummary')
+    totals = dict(Question.objects.order_by().values('quiz').annotate(total=Sum('points')).values_list('quiz', 'total'))
+
+    attempts, quiz_ids = [], set()
+    for attempt in QuizAttempt.objects.filter(total_points=0).select_related('quiz').iterator():
+        earned = int(attempt.score)
+        total = totals.get(attempt.quiz_id) or 0
+        score = Decimal('0.00')
+        if total:
+            # Capped, in case questions were removed since
+            score = min(Decimal(earned * 100) / total, Decimal(100)).quantize(Decimal('0.01'), ROUND_HALF_UP)
+        attempt.earned_points, attempt.total_points, attempt.score = earned, total, score
+        attempt.passed = score >= attempt.quiz.passing_score
+        attempts.append(attempt)
+        quiz_ids.add(attempt.quiz_id)
+    QuizAttempt.objects.bulk_update(attempts, ['earned_points', 'total_points', 'score', 'passed'], batch_size=500)
+
+    # Summaries were backfilled from the raw scores
+    groups = (
+        QuizAttempt.objects.filter(quiz_id__in=quiz_ids).order_by().values('student', 'quiz')
+        .annotate(best=Max('score'), passes=Count('id', filter=Q(passed=True)))
+    )
+    for group in groups.iterator():
+        QuizAttemptSummary.objects.filter(student_id=group['student'], quiz_id=group['quiz']).update(
+            best_score=group['best'], passed=bool(group['passes'])
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0029_recompile_snapshots_without_answers'),
+    ]
+
+    operations = [
+        migrations.RunPython(scores_to_percentages, migrations.RunPython.noop),
+    ]
@@ -2,9 +2,24 @@ from django.db import models
 from django.conf import settings
 import json
 from django.forms import ValidationError
+from django.utils import timezone
 
 User = settings.AUTH_USER_MODEL
 
+def save_without_rollups(instance, fields, kwargs):
+    """
+    Rolled-up fields start at zero and are only ever changed by F() updates, so saves
+    must never write back in-memory copies of them; they may be stale.
+    """
+    if instance._state.adding:
+        for name in fields:
+            setattr(instance, name, 0)
+    elif kwargs.get('update_fields') is None:
+        kwargs['update_fields'] = [
+            field.name for field in instance._meta.concrete_fields
+            if not field.primary_key and field.name not in fields
+        ]
+
 class Course(models.Model):
     title = models.CharField(max_length=255)
     description = models.TextField()
@@ -13,27 +28,63 @@ class Course(models.Model):
     instructor = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name="courses")
     created_at = models.DateTimeField(auto_now_add=True)
     category = models.CharField(max_length=100, blank=True, null=True)
-    duration = models.PositiveIntegerField(help_text="Duration in minutes", default=0)
+    # Rolled up from lesson contents by signals (see aggregates.py), never written by save()
+    duration = models.PositiveIntegerField(help_text="Duration in minutes", default=0, editable=False)
     rating = models.DecimalField(max_digits=3, decimal_places=1, default=0.0)
     is_published = models.BooleanField(default=False)
+    # Bumped whenever the course or anything in its curriculum changes (see signals.py)
+    content_version = models.PositiveIntegerField(default=1, editable=False)
+    content_updated_at = models.DateTimeField(default=timezone.now, editable=False)
+    # Denormalized counters, kept in sync by F() updates (see aggregates.py)
+    lesson_count = models.PositiveIntegerField(default=0, editable=False)
+    quiz_count = models.PositiveIntegerField(default=0, editable=False)
+    enrollment_count = models.PositiveIntegerField(default=0, editable=False)
+
+    AGGREGATE_FIELDS = ('lesson_count', 'quiz_count', 'enrollment_count', 'duration')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['is_published', '-created_at', '-id']),
+            models.Index(fields=['instructor', '-created_at', '-id']),
+        ]
     
     def __str__(self):
         return self.title
 
+    def save(self, *args, **kwargs):
+        save_without_rollups(self, self.AGGREGATE_FIELDS, kwargs)
+        super().save(*args, **kwargs)
+
+class CourseSnapshot(models.Model):
+    """The public detail tree of a published course, compiled at publish time (see snapshots.py)"""
+    course = models.OneToOneField(Course, on_delete=models.CASCADE, primary_key=True, related_name="snapshot")
+    document = models.JSONField()
+    content_hash = models.CharField(max_length=64)  # sha256 of the canonical JSON
+    content_version = models.PositiveIntegerField(help_text="Course content version the document was compiled from")
+    compiled_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"Snapshot of course {self.course_id} (v{self.content_version})"
+
 class CourseModule(models.Model):
     course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name="modules")
     title = models.CharField(max_length=255)
     position = models.PositiveIntegerField(default=0)  # Order of modules in the course
+    duration = models.PositiveIntegerField(default=0, editable=False, help_text="Sum of lesson durations in minutes")
     
     class Meta:
         ordering = ['position']
         
     def __str__(self):
         return f"{self.course.title} - Module {self.position}: {self.title}"
+
+    def save(self, *args, **kwargs):
+        save_without_rollups(self, ('duration',), kwargs)
+        super().save(*args, **kwargs)
         
     def duration_minutes(self):
-        """Calculate total duration of all lessons in this module"""
-        return sum(lesson.duration for lesson in self.lessons.all())
+        """Total duration of all lessons in this module"""
+        return self.duration
 
 class Lesson(models.Model):
     course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name="lessons")
@@ -41,7 +92,7 @@ class Lesson(models.Model):
     title = models.CharField(max_length=255)
     description = models.TextField(blank=True, null=True)
     position = models.PositiveIntegerField(default=0)
-    duration = models.PositiveIntegerField(help_text="Total duration in minutes", default=0)
+    duration = models.PositiveIntegerField(help_text="Sum of content durations in minutes", default=0, editable=False)
 
     class Meta:
         ordering = ['position']
@@ -49,6 +100,21 @@ class Lesson(models.Model):
     def __str__(self):
         return f"{self.course.title} - {self.title}"
 
+    def save(self, *args, **kwargs):
+        save_without_rollups(self, ('duration',), kwargs)
+        super().save(*args, **kwargs)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored module and course so a move can shift the duration and counters
+        loaded = dict(zip(field_names, values))
+        if 'module_id' in loaded:
+            instance._loaded_module_id = loaded['module_id']
+        if 'course_id' in loaded:
+            instance._loaded_course_id = loaded['course_id']
+        return instance
+
 class LessonContent(models.Model):
     CONTENT_TYPES = [
         ('video', 'Video'),
@@ -69,6 +135,13 @@ class LessonContent(models.Model):
     def __str__(self):
         return f"{self.lesson.title} - Content {self.position} ({self.content_type})"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored duration so saves can roll up the difference
+        instance._loaded_duration = dict(zip(field_names, values)).get('duration')
+        return instance
+
     def clean(self):
         if self.content_type == 'video' and self.video_id and len(self.video_id) != 11:
             raise ValidationError("Video ID must be 11 characters long for YouTube.")
@@ -104,13 +177,32 @@ class Quiz(models.Model):
     max_attempts = models.PositiveIntegerField(default=3, help_text="Maximum number of attempts allowed")
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Bumped by F() updates whenever the quiz or a question changes, so builds from it can be cached (see caching.py)
+    version = models.PositiveIntegerField(default=0, editable=False)
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['course', '-created_at', '-id']),
+            models.Index(fields=['lesson', '-created_at', '-id']),
+        ]
 
     def __str__(self):
         return f"{self.lesson.title} - {self.title}"
 
+    def save(self, *args, **kwargs):
+        save_without_rollups(self, ('version',), kwargs)
+        super().save(*args, **kwargs)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored course so a move can shift the course counters
+        loaded = dict(zip(field_names, values))
+        if 'course_id' in loaded:
+            instance._loaded_course_id = loaded['course_id']
+        return instance
+
     def total_questions(self):
         return self.questions.count()
 
@@ -130,6 +222,7 @@ class Question(models.Model):
     points = models.PositiveIntegerField(default=1)
     position = models.PositiveIntegerField(default=0)
     explanation = models.TextField(blank=True)
+    pool = models.CharField(max_length=50, blank=True, help_text="Tag of the question pool this question is drawn from")
 
     class Meta:
         ordering = ['position']
@@ -137,15 +230,24 @@ class Question(models.Model):
             models.Index(fields=['quiz', 'position']),
         ]
 
-    def save(self, *args, **kwargs):
+    def check_answer(self):
+        """Normalize choices for the question type and check correct_answer against them. Raises ValueError"""
         if self.question_type in ['multiple_choice_single', 'multiple_choice_multiple']:
             if not self.choices or len(self.choices) < 2:
                 raise ValueError("Multiple choice questions must have at least 2 choices")
-            if self.question_type == 'multiple_choice_single' and not isinstance(self.correct_answer, str):
-                raise ValueError("Single-answer question must have a string correct answer")
-            if self.question_type == 'multiple_choice_multiple' and not isinstance(self.correct_answer, list):
-                raise ValueError("Multiple-answer question must have a list of correct answers")
+            valid_labels = [chr(65+i) for i in range(len(self.choices))]
+            if self.question_type == 'multiple_choice_single':
+                if not isinstance(self.correct_answer, str):
+                    raise ValueError("Single-answer question must have a string correct answer")
+                if self.correct_answer not in valid_labels:
+                    raise ValueError("Correct answer must be a valid option label (e.g., 'A')")
+            if self.question_type == 'multiple_choice_multiple':
+                if not isinstance(self.correct_answer, list):
+                    raise ValueError("Multiple-answer question must have a list of correct answers")
+                if not all(a in valid_labels for a in self.correct_answer):
+                    raise ValueError("Correct answer must be a list of valid option labels (e.g., ['A', 'C'])")
         elif self.question_type == 'true_false':
+            # Stored and graded as 'True'/'False', like QuestionSerializer accepts
             self.choices = ['True', 'False']
             if self.correct_answer not in ['True', 'False']:
                 raise ValueError("True/False question must have 'True' or 'False' as correct answer")
@@ -153,25 +255,28 @@ class Question(models.Model):
             self.choices = []
             if not isinstance(self.correct_answer, str):
                 raise ValueError("Short answer question must have a string correct answer")
-        super().save(*args, **kwargs)
-        
-        # Validate correct_answer
-        valid_labels = [chr(65+i) for i in range(len(self.choices))]
-        if self.question_type == 'multiple_choice_single':
-            if not isinstance(self.correct_answer, str) or not self.correct_answer in valid_labels:
-                raise ValueError("Correct answer must be a valid option label (e.g., 'A')")
-        elif self.question_type == 'multiple_choice_multiple':
-            if not isinstance(self.correct_answer, list) or not all(a in valid_labels for a in self.correct_answer):
-                raise ValueError("Correct answer must be a list of valid option labels (e.g., ['A', 'C'])")
-        elif self.question_type == 'true_false':
-            if not self.correct_answer in ['A', 'B']:
-                raise ValueError("Correct answer must be 'A' or 'B' for True/False")
-        
+
+    def save(self, *args, **kwargs):
+        # Validated before the one write, so an invalid question is never saved
+        self.check_answer()
         super().save(*args, **kwargs)
 
     def __str__(self):
             return f"{self.quiz.title} - {self.text[:30]}"
-    
+
+class QuestionPool(models.Model):
+    """Each paper of the quiz draws `draw` of the questions tagged `tag` (see papers.py)"""
+    quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE, related_name='pools')
+    tag = models.CharField(max_length=50)
+    draw = models.PositiveIntegerField(help_text="Number of questions drawn from the pool for each attempt")
+
+    class Meta:
+        ordering = ['tag']
+        unique_together = ['quiz', 'tag']
+
+    def __str__(self):
+        return f"{self.quiz.title} - {self.tag} ({self.draw})"
+
 class QuizAttempt(models.Model):
     student = models.ForeignKey(User, on_delete=models.CASCADE, related_name="quiz_attempts")
     quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE, related_name="attempts")
@@ -189,6 +294,8 @@ class QuizAttempt(models.Model):
         unique_together = ['student', 'quiz', 'started_at']  # Allow multiple attempts but track them
         indexes = [
             models.Index(fields=['quiz', 'student']),
+            models.Index(fields=['student', '-started_at', '-id']),
+            models.Index(fields=['quiz', 'student', '-started_at', '-id']),
         ]
 
     def __str__(self):
@@ -198,6 +305,38 @@ class QuizAttempt(models.Model):
         # Calculate if passed based on quiz passing score
         self.passed = self.score >= self.quiz.passing_score
         super().save(*args, **kwargs)
+
+class QuizAttemptAnswer(models.Model):
+    """One graded answer of an attempt, normalized for item analysis (see analytics.py)"""
+    attempt = models.ForeignKey(QuizAttempt, on_delete=models.CASCADE, related_name="graded_answers")
+    question = models.ForeignKey(Question, on_delete=models.CASCADE, related_name="attempt_answers")
+    # Option label(s) as "A" or "A,C", or the normalized short answer; null when unanswered
+    answer = models.CharField(max_length=255, null=True, blank=True)
+    is_correct = models.BooleanField(default=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['question', 'is_correct']),
+            models.Index(fields=['question', 'answer']),
+        ]
+
+    def __str__(self):
+        return f"Attempt {self.attempt_id} - Question {self.question_id}: {self.answer}"
+
+class QuizAttemptSummary(models.Model):
+    """One row per student and quiz, kept by attempts.py so limits and listings never count QuizAttempt"""
+    student = models.ForeignKey(User, on_delete=models.CASCADE, related_name="quiz_attempt_summaries")
+    quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE, related_name="attempt_summaries")
+    attempts_count = models.PositiveIntegerField(default=0)
+    best_score = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)
+    last_attempt = models.ForeignKey(QuizAttempt, on_delete=models.SET_NULL, null=True, blank=True, related_name="+")
+    passed = models.BooleanField(default=False)
+
+    class Meta:
+        unique_together = ['student', 'quiz']
+
+    def __str__(self):
+        return f"{self.student} - {self.quiz.title}: {self.attempts_count} attempt(s)"
     
 # Assignment Model
 class Assignment(models.Model):
@@ -220,6 +359,7 @@ class Enrollment(models.Model):
         unique_together = ("student", "course")  # Prevent duplicate enrollments
         indexes = [
             models.Index(fields=['student', 'course']),
+            models.Index(fields=['course', '-enrolled_at', '-id']),
         ]
 
     def __str__(self):
@@ -0,0 +1,163 @@
+"""
+Bulk reordering for the position-ordered course models.
+
+Positions are sparse (new orders are spaced GAP apart), so moving an item
+only rewrites that item: it takes a free integer between its new neighbours.
+Rows whose relative order is already right (the longest increasing run of
+current positions) are never touched. When a gap runs out the siblings are
+renumbered, which is the only case that rewrites everything.
+"""
+from bisect import bisect_left
+
+from django.db import transaction
+from django.db.models import F
+from rest_framework.exceptions import PermissionDenied, ValidationError
+
+from .caching import bump_course_version
+from .models import CourseModule, Lesson, LessonContent, Resource
+
+GAP = 1024
+
+# name: (model, sibling scope, course lookup, owner lookup)
+ORDERED_MODELS = {
+    'modules': (CourseModule, 'course_id', 'course_id', 'course__instructor'),
+    'lessons': (Lesson, 'module_id', 'course_id', 'course__instructor'),
+    'contents': (LessonContent, 'lesson_id', 'lesson__course_id', 'lesson__course__instructor'),
+    'resources': (Resource, 'lesson_id', 'lesson__course_id', 'lesson__course__instructor'),
+}
+
+
+def longest_increasing(positions):
+    """Indexes of a longest strictly increasing subsequence of `positions`, skipping None"""
+    tails, tail_index, previous = [], [], [None] * len(positions)
+    for index, position in enumerate(positions):
+        if position is None:
+            continue
+        slot = bisect_left(tails, position)
+        if slot == len(tails):
+            tails.append(position)
+            tail_index.append(index)
+        else:
+            tails[slot] = position
+            tail_index[slot] = index
+        previous[index] = tail_index[slot - 1] if slot else None
+    keep = set()
+    index = tail_index[-1] if tail_index else None
+    while index is not None:
+        keep.add(index)
+        index = previous[index]
+    return keep
+
+
+def plan_positions(positions):
+    """
+    `positions` are the current positions of the rows, listed in their new order (None
+    for rows that don't exist yet). Returns {index: new position} for just the rows that
+    have to be placed. New positions avoid every current one, so a single UPDATE can't
+    trip a unique constraint. Returns None when there's no room left and the rows need
+    renumbering.
+    """
+    keep = longest_increasing(positions)
+    occupied = {position for position in positions if position is not None}
+    moves, run, low = {}, [], -1
+    for index in range(len(positions) + 1):
+        last = index == len(positions)
+        if not last and index not in keep:
+            run.append(index)
+            continue
+        position = None if last else positions[index]
+        if run:
+            if last:
+                # Trailing run: append after everything
+                start = max(occupied, default=0)
+                targets = [start + GAP * step for step in range(1, len(run) + 1)]
+            else:
+                targets = [low + (position - low) * step // (len(run) + 1) for step in range(1, len(run) + 1)]
+                if any(not low < target < position for target in targets) or len(set(targets)) < len(targets):
+                    return None
+            if occupied.intersection(targets):
+                return None
+            moves.update(zip(run, targets))
+            run = []
+        if not last:
+            low = position
+    return moves
+
+
+def renumbered(positions):
+    """{index: new position} spacing every row GAP apart, for when plan_positions() finds no room"""
+    return {
+        index: GAP * (index + 1) for index, position in enumerate(positions)
+        if position != GAP * (index + 1)
+    }
+
+
+def _check_ids(name, ids):
+    if not ids or not all(isinstance(pk, int) for pk in ids) or len(set(ids)) != len(ids):
+        raise ValidationError({'ids': "Must be a non-empty list of distinct ids"})
+
+
+def siblings(name, pk):
+    """
+    The `name` rows sharing a parent with row `pk` (lessons without a module are
+    siblings within their course), or None if there's no such row
+    """
+    model, scope, course_lookup, _ = ORDERED_MODELS[name]
+    row = model.objects.filter(pk=pk).values(scope, course_pk=F(course_lookup)).first()
+    if row is None:
+        return None
+    if row[scope] is None:
+        return model.objects.filter(**{f'{scope}__isnull': True, course_lookup: row['course_pk']})
+    return model.objects.filter(**{scope: row[scope]})
+
+
+def merged_order(name, ids):
+    """
+    Every sibling of the listed rows in its current order, with the slots the listed rows
+    hold refilled by `ids` in the order given. For clients that send only the rows they moved.
+    """
+    _check_ids(name, ids)
+    queryset = siblings(name, ids[0])
+    if queryset is None:
+        raise ValidationError({'ids': f"Unknown {name[:-1]} id {ids[0]}"})
+    listed, moved = set(ids), iter(ids)
+    return [next(moved) if pk in listed else pk for pk in queryset.order_by('position', 'pk').values_list('pk', flat=True)]
+
+
+def reorder(name, ids, user):
+    """
+    Put the `name` rows listed in `ids` into that order. `ids` must list every sibling
+    (same course/module/lesson) exactly once, and the course must belong to `user`.
+    Returns the number of rows written.
+    """
+    model, scope, course_lookup, owner = ORDERED_MODELS[name]
+    _check_ids(name, ids)
+    with transaction.atomic():
+        # Ownership, sibling set and current positions of the rows, locked until the update
+        queryset = siblings(name, ids[0])
+        rows = {} if queryset is None else {
+            row['id']: row for row in
+            queryset.select_for_update(of=('self',))
+            .values('id', 'position', course_pk=F(course_lookup), owner_pk=F(owner))
+        }
+        if not rows:
+            raise ValidationError({'ids': f"Unknown {name[:-1]} id {ids[0]}"})
+        if any(row['owner_pk'] != user.pk for row in rows.values()):
+            raise PermissionDenied("You are not authorized to reorder this course")
+        if set(rows) != set(ids):
+            raise ValidationError({'ids': f"Must list every {name[:-1]} of the same parent exactly once"})
+
+        positions = [rows[pk]['position'] for pk in ids]
+        moves = plan_positions(positions)
+        if moves is None:
+            moves = renumbered(positions)
+            # Park the renumbered rows above every position in play so no two rows ever share one
+            offset = max(positions + [GAP * len(ids)]) + 1
+            model.objects.filter(pk__in=[ids[index] for index in moves]).update(position=F('position') + offset)
+        if not moves:
+            return 0
+        changed = [model(pk=ids[index], position=position) for index, position in moves.items()]
+        model.objects.bulk_update(changed, ['position'])
+        # bulk_update skips post_save, so invalidate the cached trees here
+        bump_course_version(next(iter(rows.values()))['course_pk'])
+    return len(changed)
@@ -0,0 +1,28 @@
+from rest_framework.pagination import CursorPagination
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Cursor pagination over an indexed (timestamp, id) ordering.
+    The id tiebreaker keeps pages stable when timestamps collide.
+    """
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+class CreatedAtCursorPagination(KeysetPagination):
+    ordering = ('-created_at', '-id')
+
+
+class EnrolledAtCursorPagination(KeysetPagination):
+    ordering = ('-enrolled_at', '-id')
+
+
+class StartedAtCursorPagination(KeysetPagination):
+    ordering = ('-started_at', '-id')
+
+
+class IdCursorPagination(KeysetPagination):
+    # Lessons have no timestamp; the primary key is the only stable key
+    ordering = ('id',)
@@ -0,0 +1,138 @@
+"""
+Per-student quiz papers.
+
+A quiz with question pools puts `draw` randomly chosen questions of each pool
+on every paper (untagged questions, and tags without a pool, are always on it),
+and a quiz with shuffle_questions set shuffles the question order and the
+choices of multiple choice questions. Papers aren't stored: each is rebuilt
+from a seed of (quiz, quiz version, student, attempt number), so the take and
+submit views derive the same paper independently, from the quiz's layout
+cached per version, without reading any rows.
+
+Students answer with the labels they were shown; to_quiz_answers() maps them
+back to the quiz's own labels before grading, so the answer key, the stored
+answers and item analysis never see shuffled labels.
+"""
+import hashlib
+import random
+from collections import defaultdict
+from typing import NamedTuple
+
+from .caching import get_cached_quiz_build
+from .models import Question, QuestionPool
+
+SHUFFLED_TYPES = ('multiple_choice_single', 'multiple_choice_multiple')
+
+
+class Paper(NamedTuple):
+    question_ids: tuple  # in the order shown
+    choice_orders: dict  # {question id: indexes of the quiz's choices, in the order shown}
+
+
+def compile_layout(quiz_id):
+    """What papers are drawn from: pool sizes and (id, pool, type, number of choices) per question"""
+    return {
+        'draws': dict(QuestionPool.objects.filter(quiz_id=quiz_id).values_list('tag', 'draw')),
+        'questions': [
+            (pk, pool, question_type, len(choices) if isinstance(choices, list) else 0)
+            for pk, pool, question_type, choices in
+            Question.objects.filter(quiz_id=quiz_id).values_list('id', 'pool', 'question_type', 'choices')
+        ],
+    }
+
+
+def get_layout(quiz):
+    return get_cached_quiz_build(quiz, 'layout', lambda: compile_layout(quiz.pk))
+
+
+def uses_papers(quiz):
+    """Whether students get their own papers rather than the whole quiz in order"""
+    return quiz.shuffle_questions or bool(get_layout(quiz)['draws'])
+
+
+def paper_seed(quiz, student_id, attempt_number):
+    digest = hashlib.sha256(f"{quiz.pk}:{quiz.version}:{student_id}:{attempt_number}".encode()).digest()
+    return int.from_bytes(digest[:8], 'big')
+
+
+def build_paper(quiz, student_id, attempt_number):
+    """The paper for a student's `attempt_number`th attempt, or None if every student gets the whole quiz"""
+    if not uses_papers(quiz):
+        return None
+    layout = get_layout(quiz)
+    rng = random.Random(paper_seed(quiz, student_id, attempt_number))
+    pools = defaultdict(list)
+    for pk, pool, _, _ in layout['questions']:
+        if pool in layout['draws']:
+            pools[pool].append(pk)
+    drawn = set()
+    for tag in sorted(pools):
+        drawn.update(rng.sample(pools[tag], min(layout['draws'][tag], len(pools[tag]))))
+    questions = [row for row in layout['questions'] if row[1] not in layout['draws'] or row[0] in drawn]
+
+    choice_orders = {}
+    if quiz.shuffle_questions:
+        rng.shuffle(questions)
+        for pk, _, question_type, choice_count in questions:
+            if question_type in SHUFFLED_TYPES:
+                order = list(range(choice_count))
+                rng.shuffle(order)
+                choice_orders[pk] = order
+    return Paper(tuple(row[0] for row in questions), choice_orders)
+
+
+def paper_payload(take_data, paper):
+    """The shared take payload cut down and reordered to one student's paper"""
+    by_id = {question['id']: question for question in take_data['questions']}
+    questions = []
+    for pk in paper.question_ids:
+        question = by_id[pk]
+        order = paper.choice_orders.get(pk)
+        if order is not None:
+            question = {**question, 'choices': [question['choices'][index] for index in order]}
+        questions.append(question)
+    return {**take_data, 'questions': questions, 'total_questions': len(questions)}
+
+
+def _label_map(order):
+    """{shown label: quiz label}"""
+    return {chr(65 + index): chr(65 + original) for index, original in enumerate(order)}
+
+
+def to_quiz_answers(answers, paper):
+    """Submitted answers in the quiz's own labels, keeping only the questions on the paper"""
+    mapped = {}
+    for pk in paper.question_ids:
+        answer = answers.get(str(pk))
+        order = paper.choice_orders.get(pk)
+        if order is not None:
+            labels = _label_map(order)
+            if isinstance(answer, list):
+                answer = [labels.get(label, label) if isinstance(label, str) else label for label in answer]
+            elif isinstance(answer, str):
+                answer = labels.get(answer, answer)
+        mapped[str(pk)] = answer
+    return mapped
+
+
+def paper_key(answer_key, paper):
+    """The entries of an answer key on a paper, in paper order"""
+    by_id = {entry.id: entry for entry in answer_key}
+    return tuple(by_id[pk] for pk in paper.question_ids if pk in by_id)
+
+
+def shown_results(results, answer_key, paper, answers):
+    """Detailed grading results in the labels the student was shown"""
+    shown = {}
+    for entry in answer_key:
+        result = results[entry.id]
+        order = paper.choice_orders.get(entry.id)
+        if order is not None:
+            labels = {quiz_label: shown_label for shown_label, quiz_label in _label_map(order).items()}
+            if isinstance(entry.expected, frozenset):
+                correct = sorted(labels.get(label, label) for label in entry.expected)
+            else:
+                correct = labels.get(entry.expected, entry.expected)
+            result = {**result, 'your_answer': answers.get(str(entry.id)), 'correct_answer': correct}
+        shown[entry.id] = result
+    return shown
@@ -0,0 +1,231 @@
+"""
+Bulk question import.
+
+Question banks come as CSV, JSON or Moodle GIFT. Each format is parsed into
+rows shaped like QuestionSerializer input, every row is validated up front
+with the serializer's rules and Question.check_answer(), and the bank is
+inserted with one bulk_create, so an import costs a handful of queries however
+many questions it has. Nothing is imported if any row is invalid; the errors
+name the rows (numbered from 1, in file order).
+
+CSV has a header row with the QuestionSerializer field names (text,
+question_type, choices, correct_answer, points, position, explanation, pool).
+Choices, and the correct answers of multiple-answer questions, are separated
+by "|". JSON is a list of QuestionSerializer objects, or {"questions": [...]}.
+GIFT supports multiple choice (one or several answers), true/false and short
+answer questions; $CATEGORY sets the pool of the questions after it.
+"""
+import csv
+import io
+import json
+import re
+
+from django.db import transaction
+from django.db.models import F, Max
+from rest_framework.exceptions import ValidationError
+
+from .caching import bump_course_version
+from .models import Question, Quiz
+from .serializers import QuestionSerializer
+
+FORMATS = ('csv', 'json', 'gift')
+LIST_SEPARATOR = '|'
+
+
+class RowError(Exception):
+    """A question the parser couldn't read; reported with the validation errors"""
+
+
+class QuestionImportSerializer(QuestionSerializer):
+    # The quiz comes from the URL, so validating a row never queries it
+    class Meta(QuestionSerializer.Meta):
+        fields = [name for name in QuestionSerializer.Meta.fields if name not in ('id', 'quiz')]
+
+
+def guess_format(filename):
+    extension = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+    return {'txt': 'gift'}.get(extension, extension)
+
+
+def parse_questions(data, bank_format):
+    """Rows (dicts, or RowError for questions that couldn't be read) from a question bank"""
+    if bank_format not in FORMATS:
+        raise ValidationError({'format': f"Expected one of {', '.join(FORMATS)}"})
+    if isinstance(data, bytes):
+        try:
+            data = data.decode('utf-8-sig')
+        except UnicodeDecodeError:
+            raise ValidationError({'file': "Question banks must be UTF-8 text"})
+    return {'csv': parse_csv, 'json': parse_json, 'gift': parse_gift}[bank_format](data)
+
+
+def parse_csv(text):
+    rows = []
+    for record in csv.DictReader(io.StringIO(text)):
+        # Blank cells fall back to the field defaults
+        row = {name: value.strip() for name, value in record.items() if name and value and value.strip()}
+        if 'choices' in row:
+            row['choices'] = [choice.strip() for choice in row['choices'].split(LIST_SEPARATOR)]
+        if row.get('question_type') == 'multiple_choice_multiple' and 'correct_answer' in row:
+            row['correct_answer'] = [label.strip() for label in row['correct_answer'].split(LIST_SEPARATOR)]
+        rows.append(row)
+    return rows
+
+
+def parse_json(text):
+    try:
+        data = json.loads(text)
+    except ValueError:
+        raise ValidationError({'file': "Not valid JSON"})
+    if isinstance(data, dict):
+        data = data.get('questions')
+    if not isinstance(data, list):
+        raise ValidationError({'file': "Expected a list of questions, or {\"questions\": [...]}"})
+    return [row if isinstance(row, dict) else RowError("Expected a question object") for row in data]
+
+
+# GIFT escapes its special characters with a backslash
+GIFT_ESCAPED = re.compile(r'\\([~=#{}:])')
+GIFT_ANSWER = re.compile(r'(?<!\\)([=~])')
+GIFT_WEIGHT = re.compile(r'^%(-?\d+(?:\.\d+)?)%')
+
+
+def _unescape(text):
+    return GIFT_ESCAPED.sub(r'\1', text).strip()
+
+
+def _unescaped(pattern, text):
+    """Index of the first unescaped occurrence of `pattern` in text, or -1"""
+    match = re.search(r'(?<!\\)' + re.escape(pattern), text)
+    return match.start() if match else -1
+
+
+def _gift_blocks(text):
+    """(pool, question text) for each question, which are separated by blank lines"""
+    pool, lines = '', []
+    for line in text.splitlines() + ['']:
+        stripped = line.strip()
+        if stripped.startswith('//'):
+            continue
+        if stripped.startswith('$CATEGORY:'):
+            pool = stripped[len('$CATEGORY:'):].strip().rstrip('/').rsplit('/', 1)[-1]
+            continue
+        if stripped:
+            lines.append(line)
+        elif lines:
+            yield pool, '\n'.join(lines)
+            lines = []
+
+
+def parse_gift_question(block):
+    """One GIFT question as a QuestionSerializer row. Raises RowError"""
+    block = block.strip()
+    if block.startswith('::'):
+        end = block.find('::', 2)
+        if end == -1:
+            raise RowError("Unterminated question title")
+        block = block[end + 2:].strip()
+    block = re.sub(r'^\[\w+\]', '', block)  # [html], [markdown], ... text formats
+    start = _unescaped('{', block)
+    end = _unescaped('}', block)
+    if start == -1 or end < start:
+        raise RowError("Question has no {answer} block")
+    before, body, after = block[:start].strip(), block[start + 1:end], block[end + 1:].strip()
+    text = _unescape(f"{before} _____ {after}" if after else before)
+    explanation = ''
+    general = body.find('####')
+    if general != -1:
+        body, explanation = body[:general], _unescape(body[general + 4:])
+    row = {'text': text, 'explanation': explanation}
+
+    stripped = body.strip()
+    truth = stripped.split('#', 1)[0].strip().upper()
+    if truth in ('T', 'TRUE', 'F', 'FALSE'):
+        return {**row, 'question_type': 'true_false', 'correct_answer': 'True' if truth.startswith('T') else 'False'}
+    if not stripped:
+        raise RowError("Essay questions aren't supported")
+    if stripped.startswith('#'):
+        raise RowError("Numerical questions aren't supported")
+
+    parts = GIFT_ANSWER.split(stripped)
+    if parts[0].strip():
+        raise RowError("Answers must start with = or ~")
+    answers = []
+    for marker, answer in zip(parts[1::2], parts[2::2]):
+        feedback = _unescaped('#', answer)
+        if feedback != -1:
+            answer = answer[:feedback]
+        weight = GIFT_WEIGHT.match(answer.strip())
+        if weight:
+            answer = answer.strip()[weight.end():]
+        if '->' in answer:
+            raise RowError("Matching questions aren't supported")
+        correct = marker == '=' or (weight is not None and float(weight.group(1)) > 0)
+        answers.append((_unescape(answer), correct, marker))
+
+    if all(marker == '=' for _, _, marker in answers):
+        # Short answer; the first accepted answer is the one graded against
+        return {**row, 'question_type': 'short_answer', 'correct_answer': answers[0][0]}
+    choices = [answer for answer, _, _ in answers]
+    labels = [chr(65 + index) for index, (_, correct, _) in enumerate(answers) if correct]
+    if len(labels) == 1 and not any(GIFT_WEIGHT.match(part.strip()) for part in parts[2::2]):
+        return {**row, 'question_type': 'multiple_choice_single', 'choices': choices, 'correct_answer': labels[0]}
+    return {**row, 'question_type': 'multiple_choice_multiple', 'choices': choices, 'correct_answer': labels}
+
+
+def parse_gift(text):
+    rows = []
+    for pool, block in _gift_blocks(text):
+        try:
+            row = parse_gift_question(block)
+        except RowError as e:
+            rows.append(e)
+            continue
+        if pool:
+            row['pool'] = pool[:50]
+        rows.append(row)
+    return rows
+
+
+def validate_rows(quiz, rows):
+    """Unsaved Questions for `quiz`, or a ValidationError listing every invalid row"""
+    questions, errors = [], []
+    for number, row in enumerate(rows, start=1):
+        if isinstance(row, RowError):
+            errors.append({'row': number, 'errors': {'non_field_errors': [str(row)]}})
+            continue
+        serializer = QuestionImportSerializer(data=row)
+        if not serializer.is_valid():
+            errors.append({'row': number, 'errors': serializer.errors})
+            continue
+        question = Question(quiz=quiz, **serializer.validated_data)
+        try:
+            question.check_answer()
+        except ValueError as e:
+            errors.append({'row': number, 'errors': {'non_field_errors': [str(e)]}})
+            continue
+        if 'position' not in serializer.validated_data:
+            question.position = None  # filled in by import_questions
+        questions.append(question)
+    if errors:
+        raise ValidationError({'questions': errors})
+    if not questions:
+        raise ValidationError({'questions': "No questions found"})
+    return questions
+
+
+def import_questions(quiz, rows):
+    """Validate every row, then add them all to `quiz`. Returns the created Questions"""
+    questions = validate_rows(quiz, rows)
+    with transaction.atomic():
+        # Questions without a position go after the quiz's existing ones, in file order
+        position = (Question.objects.filter(quiz=quiz).aggregate(last=Max('position'))['last'] or 0) + 1
+        for question in questions:
+            if question.position is None:
+                question.position = position
+                position += 1
+        created = Question.objects.bulk_create(questions, batch_size=500)
+        # bulk_create skips the signals that version the quiz's cached builds and the course tree
+        Quiz.objects.filter(pk=quiz.pk).update(version=F('version') + 1)
+        bump_course_version(quiz.course_id)
+    return created
@@ -0,0 +1,113 @@
+"""
+Full-text course search.
+
+SQLite keeps an FTS5 table keyed by course id (rowid); Postgres keeps a
+weighted tsvector per course behind a GIN index. Both tables are created by
+migration 0020 and only ever hold published courses.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Q
+
+from .models import Course, CourseOutcome, Lesson
+
+SEARCH_TABLE = 'courses_course_search'
+
+# bm25 column weights: title, description, category, outcomes, lessons
+FTS5_WEIGHTS = (10.0, 2.0, 5.0, 3.0, 2.0)
+
+
+def _document(course):
+    outcomes = CourseOutcome.objects.filter(course=course).values_list('text', flat=True)
+    lessons = Lesson.objects.filter(course=course).values_list('title', flat=True)
+    return [
+        course.title,
+        course.description,
+        course.category or '',
+        ' '.join(outcomes),
+        ' '.join(lessons),
+    ]
+
+
+def remove_course(course_id):
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute(f"DELETE FROM {SEARCH_TABLE} WHERE rowid = %s", [course_id])
+        elif connection.vendor == 'postgresql':
+            cursor.execute(f"DELETE FROM {SEARCH_TABLE} WHERE course_id = %s", [course_id])
+
+
+def index_course(course_id):
+    """(Re)index a single course; unpublished or missing courses are dropped from the index"""
+    if connection.vendor not in ('sqlite', 'postgresql'):
+        return
+    course = Course.objects.filter(pk=course_id, is_published=True).first()
+    if course is None:
+        remove_course(course_id)
+        return
+    title, description, category, outcomes, lessons = _document(course)
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute(f"DELETE FROM {SEARCH_TABLE} WHERE rowid = %s", [course_id])
+            cursor.execute(
+                f"INSERT INTO {SEARCH_TABLE} (rowid, title, description, category, outcomes, lessons) "
+                "VALUES (%s, %s, %s, %s, %s, %s)",
+                [course_id, title, description, category, outcomes, lessons]
+            )
+        else:
+            cursor.execute(
+                f"INSERT INTO {SEARCH_TABLE} (course_id, document) VALUES (%s, "
+                "setweight(to_tsvector('english', %s), 'A') || "
+                "setweight(to_tsvector('english', %s), 'A') || "
+                "setweight(to_tsvector('english', %s), 'B') || "
+                "setweight(to_tsvector('english', %s), 'C') || "
+                "setweight(to_tsvector('english', %s), 'D')) "
+                "ON CONFLICT (course_id) DO UPDATE SET document = EXCLUDED.document",
+                [course_id, title, category, outcomes, lessons, description]
+            )
+
+
+def rebuild_index():
+    """Re-index every published course. Returns the number of indexed courses"""
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {SEARCH_TABLE}")
+    course_ids = list(Course.objects.filter(is_published=True).values_list('id', flat=True))
+    for course_id in course_ids:
+        index_course(course_id)
+    return len(course_ids)
+
+
+def _fts5_query(query):
+    # Quote every term so user input can't inject FTS5 operators; prefix-match for type-ahead
+    terms = re.findall(r'\w+', query)
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+def search_course_ids(query, limit=20):
+    """Ids of published courses matching `query`, best match first"""
+    if connection.vendor == 'sqlite':
+        match = _fts5_query(query)
+        if not match:
+            return []
+        sql = (
+            f"SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s "
+            f"ORDER BY bm25({SEARCH_TABLE}, {', '.join(map(str, FTS5_WEIGHTS))}) LIMIT %s"
+        )
+        params = [match, limit]
+    elif connection.vendor == 'postgresql':
+        sql = (
+            f"SELECT course_id FROM {SEARCH_TABLE}, websearch_to_tsquery('english', %s) query "
+            "WHERE document @@ query ORDER BY ts_rank(document, query) DESC LIMIT %s"
+        )
+        params = [query, limit]
+    else:
+        # No index available on other backends; fall back to a plain scan
+        return list(
+            Course.objects.filter(is_published=True)
+            .filter(Q(title__icontains=query) | Q(description__icontains=query) | Q(category__icontains=query))
+            .values_list('id', flat=True)[:limit]
+        )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [row[0] for row in cursor.fetchall()]
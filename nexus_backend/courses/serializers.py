@@ -1,17 +1,116 @@
 from rest_framework import serializers
-from django.db import models
+from django.db import models, transaction
 from .models import (
     Course, Lesson, LessonContent, Assignment, Enrollment, 
     LessonProgress, CourseModule, CourseOutcome, CourseRequirement,
-    Quiz, Question, QuizAttempt, Resource
+    Quiz, Question, QuizAttempt, QuizAttemptSummary, Resource
     )
+from .aggregates import roll_up_duration
+from .caching import bump_course_version
+from .ordering import GAP, plan_positions, renumbered
 from django.contrib.auth import get_user_model
+import hashlib
 import logging
 logger = logging.getLogger(__name__)
 
 User = get_user_model()
 
 
+# Sparse fieldsets (?fields=) and explicit expansion (?expand=)
+class Shape:
+    """
+    Requested response shape, parsed from ?fields=a,b and ?expand=x.y paths.
+    Paths are dotted from the root serializer, e.g. fields=title,modules.title
+    and expand=modules.lessons.contents. Expanding a path expands its parents.
+    """
+
+    def __init__(self, fields=None, expand=()):
+        self.fields = set(fields) if fields is not None else None
+        self.expanded = set()
+        for path in list(expand) + list(fields or ()):
+            parts = path.split('.')
+            self.expanded.update('.'.join(parts[:i]) for i in range(1, len(parts) + 1))
+
+    @classmethod
+    def from_request(cls, request):
+        """None when the client asked for neither, which keeps the full legacy shape"""
+        if request is None or request.method not in ('GET', 'HEAD'):
+            return None
+        params = request.query_params
+        if 'fields' not in params and 'expand' not in params:
+            return None
+        split = lambda value: [path.strip() for path in value.split(',') if path.strip()]
+        fields = split(params['fields']) if 'fields' in params else None
+        return cls(fields, split(params.get('expand', '')))
+
+    @property
+    def key(self):
+        """Stable, short identifier for cache keys (a hash, since field lists can be arbitrarily long)"""
+        fields = '*' if self.fields is None else ','.join(sorted(self.fields))
+        normalized = f"f={fields};e={','.join(sorted(self.expanded))}"
+        return hashlib.sha1(normalized.encode()).hexdigest()[:16]
+
+    def keeps(self, path, name, expandable):
+        full = f"{path}.{name}" if path else name
+        if expandable and full not in self.expanded:
+            return False
+        if self.fields is None:
+            return True
+        prefix = f"{path}." if path else ''
+        level = {f[len(prefix):].split('.')[0] for f in self.fields if f.startswith(prefix)}
+        return not level or name in level
+
+
+def get_shape(context):
+    if 'shape' not in context:
+        context['shape'] = Shape.from_request(context.get('request'))
+    return context['shape']
+
+
+def shape_prefetches(shape, relations, path=''):
+    """
+    Prefetch lookups for the nested relations a shape will actually emit.
+    `relations` mirrors the serializer nesting, e.g. COURSE_RELATIONS.
+    """
+    lookups = []
+    for name, children in relations.items():
+        full = f"{path}.{name}" if path else name
+        if shape is None or full in shape.expanded:
+            lookups.append(full.replace('.', '__'))
+            lookups += shape_prefetches(shape, children, full)
+    return lookups
+
+
+class ExpandableFieldsMixin:
+    """
+    Drops fields the request's Shape doesn't ask for. Nested relations in
+    Meta.expandable_fields are only emitted when expanded explicitly.
+    """
+
+    def get_fields(self):
+        fields = super().get_fields()
+        shape = get_shape(self.context)
+        if shape is None:
+            return fields
+        path = self.shape_path()
+        expandable = getattr(self.Meta, 'expandable_fields', ())
+        return {
+            name: field for name, field in fields.items()
+            if shape.keeps(path, name, name in expandable)
+        }
+
+    def shape_path(self):
+        names = []
+        node = self
+        while node.parent is not None:
+            if node.field_name:
+                names.append(node.field_name)
+            node = node.parent
+        if self.context.get('shape_prefix'):
+            names.append(self.context['shape_prefix'])
+        return '.'.join(reversed(names))
+
+
 class StudentProgressSerializer(serializers.ModelSerializer):
     class Meta:
         model = LessonProgress
@@ -36,7 +135,7 @@ class StudentEnrollmentSerializer(serializers.ModelSerializer):
         student = obj.student  # Use the enrolled student from the Enrollment object
         course = obj.course    # Use the related Course from the Enrollment object
         
-        total_lessons = Lesson.objects.filter(module__course=course).count()
+        total_lessons = course.lesson_count
         if total_lessons == 0:
             return {
                 'completed_count': 0,
@@ -44,11 +143,14 @@ class StudentEnrollmentSerializer(serializers.ModelSerializer):
                 'progress_percent': 0.0
             }
         
-        completed_lessons = LessonProgress.objects.filter(
-            student=student,
-            lesson__module__course=course,
-            completed=True
-        ).count()
+        # Views annotate completed_count; fall back to counting for other callers
+        completed_lessons = getattr(obj, 'completed_count', None)
+        if completed_lessons is None:
+            completed_lessons = LessonProgress.objects.filter(
+                student=student,
+                lesson__course=course,
+                completed=True
+            ).count()
         
         return {
             'completed_count': completed_lessons,
@@ -69,6 +171,13 @@ class ResourceSerializer(serializers.ModelSerializer):
 
 # Serializers for quizzes
 
+def attempts_taken_in(context, quiz, user):
+    # Views listing many quizzes pass {quiz_id: attempts} as 'attempt_counts' to avoid a lookup per quiz
+    counts = context.get('attempt_counts')
+    if counts is not None:
+        return counts.get(quiz.id, 0)
+    return QuizAttemptSummary.objects.filter(quiz=quiz, student=user).values_list('attempts_count', flat=True).first() or 0
+
 class QuizDashboardSerializer(serializers.ModelSerializer):
     course_id = serializers.SerializerMethodField()
     lesson_id = serializers.IntegerField(source='lesson.id')
@@ -89,13 +198,13 @@ class QuizDashboardSerializer(serializers.ModelSerializer):
     def get_attempts_count(self, obj):
         user = self.context['request'].user
         if user.is_authenticated:
-            return QuizAttempt.objects.filter(quiz=obj, student=user).count()
+            return attempts_taken_in(self.context, obj, user)
         return 0
 
     def get_can_attempt(self, obj):
         user = self.context['request'].user
         if user.is_authenticated and obj.is_active:
-            attempts = QuizAttempt.objects.filter(quiz=obj, student=user).count()
+            attempts = attempts_taken_in(self.context, obj, user)
             return attempts < obj.max_attempts
         return False
 
@@ -112,7 +221,7 @@ class QuestionSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Question
-        fields = ['id', 'quiz', 'text', 'question_type', 'choices', 'correct_answer', 'points', 'position', 'explanation']
+        fields = ['id', 'quiz', 'text', 'question_type', 'choices', 'correct_answer', 'points', 'position', 'explanation', 'pool']
 
 
     def validate(self, data):
@@ -160,7 +269,7 @@ class QuestionSerializer(serializers.ModelSerializer):
             return unique_choices
         return []
 
-class QuizSerializer(serializers.ModelSerializer):
+class QuizSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
     questions = QuestionSerializer(many=True, read_only=True)
     attempts_count = serializers.SerializerMethodField()
     can_attempt = serializers.SerializerMethodField()
@@ -174,6 +283,7 @@ class QuizSerializer(serializers.ModelSerializer):
             'attempts_count', 'can_attempt', 'attempts_remaining', 'shuffle_questions',
             'time_limit', 'questions', 'total_questions'
         ]
+        expandable_fields = ['questions']
 
     def get_attempts_count(self, obj):
         # Check if request is in context to avoid KeyError
@@ -181,7 +291,7 @@ class QuizSerializer(serializers.ModelSerializer):
             return 0  # Return a default value if request is not available
         user = self.context['request'].user
         if user.is_authenticated:
-            return QuizAttempt.objects.filter(quiz=obj, student=user).count()
+            return attempts_taken_in(self.context, obj, user)
         return 0
 
     def get_can_attempt(self, obj):
@@ -190,7 +300,7 @@ class QuizSerializer(serializers.ModelSerializer):
             return 0  # Return a default value if request is not available
         user = self.context['request'].user
         if user.is_authenticated and obj.is_active:
-            attempts = QuizAttempt.objects.filter(quiz=obj, student=user).count()
+            attempts = attempts_taken_in(self.context, obj, user)
             return attempts < obj.max_attempts
         return False
 
@@ -200,7 +310,7 @@ class QuizSerializer(serializers.ModelSerializer):
             return 0  # Return a default value if request is not available
         user = self.context['request'].user
         if user.is_authenticated and obj.is_active:
-            attempts = QuizAttempt.objects.filter(quiz=obj, student=user).count()
+            attempts = attempts_taken_in(self.context, obj, user)
             return max(0, obj.max_attempts - attempts)
         return 0
 
@@ -224,14 +334,28 @@ class QuizListSerializer(serializers.ModelSerializer):
     def get_total_questions(self, obj):
         return obj.total_questions()
 
+class LessonQuizSerializer(serializers.ModelSerializer):
+    """QuizListSerializer without the questions, for a lesson's quiz list. Expects the question_total annotation"""
+    total_questions = serializers.IntegerField(source='question_total', read_only=True)
+    lesson_title = serializers.CharField(source='lesson.title', read_only=True)
+
+    class Meta:
+        model = Quiz
+        fields = ['id', 'course', 'title', 'description', 'lesson', 'lesson_title', 'time_limit', 
+                 'passing_score', 'max_attempts', 'is_active', 'total_questions', 'shuffle_questions']
+
 class QuizTakeSerializer(serializers.ModelSerializer):
-    """For taking quiz - includes questions but no answers"""
+    """For taking quiz - includes questions but no answers. Has no per-user fields, so it can be shared"""
     questions = QuestionTakeSerializer(many=True, read_only=True)
+    total_questions = serializers.SerializerMethodField()
     
     class Meta:
         model = Quiz
-        fields = ['id', 'title', 'description', 'time_limit', 'passing_score', 
-                 'max_attempts', 'shuffle_questions', 'questions']
+        fields = ['id', 'title', 'lesson', 'course', 'description', 'is_active', 'time_limit', 'passing_score', 
+                 'max_attempts', 'shuffle_questions', 'questions', 'total_questions']
+
+    def get_total_questions(self, obj):
+        return len(obj.questions.all())
 
 class QuizAttemptSerializer(serializers.ModelSerializer):
     quiz_title = serializers.CharField(source='quiz.title', read_only=True)
@@ -291,15 +415,75 @@ class LessonContentSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("Text Content should be empty for video content.")
         return data
 
-class LessonSerializer(serializers.ModelSerializer):
+# Nested in LessonSerializer with a writable id, so updates can match items to existing rows
+class NestedLessonContentSerializer(LessonContentSerializer):
+    id = serializers.IntegerField(required=False)
+
+class NestedResourceSerializer(ResourceSerializer):
+    id = serializers.IntegerField(required=False)
+
+def sync_lesson_items(lesson, model, items):
+    """
+    Make the lesson's LessonContent/Resource rows match `items`, ordered as listed.
+    Items are matched to rows by id: changed rows go out in one bulk_update, new ones in
+    one bulk_create and missing ones in one delete. Rows still in order keep their
+    positions (see ordering.plan_positions), so untouched rows aren't written at all.
+    """
+    existing = {row.pk: row for row in model.objects.filter(lesson=lesson)}
+    rows = [existing.pop(item.get('id'), None) if item.get('id') is not None else None for item in items]
+    if existing:
+        model.objects.filter(pk__in=list(existing)).delete()
+
+    current = [row.position if row is not None else None for row in rows]
+    moves = plan_positions(current)
+    if moves is None:
+        # No gap left to place the items in: space them all out again
+        moves = renumbered(current)
+        parked = [rows[index].pk for index in moves if rows[index] is not None]
+        if parked:
+            # Park renumbered rows above every position in play so (lesson, position) stays unique
+            offset = max([position for position in current if position is not None] + [GAP * len(items)]) + 1
+            model.objects.filter(pk__in=parked).update(position=models.F('position') + offset)
+
+    matched, created = [], []
+    for index, (row, item) in enumerate(zip(rows, items)):
+        item = {name: value for name, value in item.items() if name != 'id'}
+        item['position'] = moves[index] if index in moves else row.position
+        if row is None:
+            created.append(model(lesson=lesson, **item))
+        else:
+            matched.append((row, item))
+
+    # bulk writes skip the post_save handlers, so roll up durations and bump the version here
+    duration_delta = sum(getattr(row, 'duration', 0) for row in created)
+    changed, changed_fields = [], set()
+    for row, item in matched:
+        diff = {name: value for name, value in item.items() if getattr(row, name) != value}
+        if diff:
+            duration_delta -= getattr(row, 'duration', 0)
+            for name, value in diff.items():
+                setattr(row, name, value)
+            duration_delta += getattr(row, 'duration', 0)
+            changed.append(row)
+            changed_fields.update(diff)
+    if changed:
+        model.objects.bulk_update(changed, sorted(changed_fields))
+    if created:
+        model.objects.bulk_create(created)
+    if changed or created:
+        roll_up_duration(duration_delta, lesson.pk, lesson.module_id, lesson.course_id)
+        bump_course_version(lesson.course_id)
+
+class LessonSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
     quizzes = QuizSerializer(many=True, read_only=True)
     assignments = AssignmentSerializer(many=True, read_only=True)
-    contents = LessonContentSerializer(many=True, required=False)
-    resources = ResourceSerializer(many=True, required=False)
+    contents = NestedLessonContentSerializer(many=True, required=False)
+    resources = NestedResourceSerializer(many=True, required=False)
 
     class Meta:
         model = Lesson
         fields = ["id", "course", "module", "title", "description", "position", "duration", "quizzes", "assignments", "contents", "resources"]
+        expandable_fields = ["quizzes", "assignments", "contents", "resources"]
 
     def validate_resources(self, value):
         if value is None:
@@ -323,39 +507,33 @@ class LessonSerializer(serializers.ModelSerializer):
         validated_data['position'] = int(validated_data.get('position', 0))
         lesson = Lesson.objects.create(**validated_data)
         for content_data in contents_data:
+            content_data.pop('id', None)
             LessonContent.objects.create(lesson=lesson, **content_data)
         for resource_data in resources_data:
+            resource_data.pop('id', None)
             Resource.objects.create(lesson=lesson, **resource_data)
+        lesson.refresh_from_db(fields=['duration'])  # rolled up by the content signals
         return lesson
 
     def update(self, instance, validated_data):
         contents_data = validated_data.pop('contents', None)
         resources_data = validated_data.pop('resources', None)
-        instance = super().update(instance, validated_data)
-        if contents_data is not None:
-            instance.contents.all().delete()
-            max_position = LessonContent.objects.filter(lesson=instance).aggregate(models.Max('position'))['position__max'] or -1
-            for index, content_data in enumerate(contents_data):
-                content_data['position'] = max_position + index + 1
-                LessonContent.objects.create(lesson=instance, **content_data)
-        if resources_data is not None:
-            instance.resources.all().delete()
-            max_position = Resource.objects.filter(lesson=instance).aggregate(models.Max('position'))['position__max'] or -1
-            for index, resource_data in enumerate(resources_data):
-                resource_data['position'] = max_position + index + 1
-                Resource.objects.create(lesson=instance, **resource_data)
+        with transaction.atomic():
+            instance = super().update(instance, validated_data)
+            if contents_data is not None:
+                sync_lesson_items(instance, LessonContent, contents_data)
+            if resources_data is not None:
+                sync_lesson_items(instance, Resource, resources_data)
+        instance.refresh_from_db(fields=['duration'])
         return instance
 
-class CourseModuleSerializer(serializers.ModelSerializer):
+class CourseModuleSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
     lessons = LessonSerializer(many=True, read_only=True)
-    duration = serializers.SerializerMethodField()
     
     class Meta:
         model = CourseModule
         fields = ["id", "title", "position", "lessons", "duration"]
-    
-    def get_duration(self, obj):
-        return obj.duration_minutes()
+        expandable_fields = ["lessons"]
 
 class ModuleCreateSerializer(serializers.ModelSerializer):
     class Meta:
@@ -372,7 +550,7 @@ class CourseRequirementSerializer(serializers.ModelSerializer):
         model = CourseRequirement
         fields = ['id', 'text', 'position']
 
-class CourseSerializer(serializers.ModelSerializer):
+class CourseSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
     instructor_details = serializers.SerializerMethodField()
     modules = serializers.SerializerMethodField()
     total_lessons = serializers.SerializerMethodField()
@@ -389,6 +567,7 @@ class CourseSerializer(serializers.ModelSerializer):
                  "duration", "rating", "modules", "total_lessons", 
                  "outcomes", "requirements", "progress_percent", "completed_lessons"]
         read_only_fields = ["created_at"]
+        expandable_fields = ["modules", "outcomes", "requirements"]
     
     def get_instructor_details(self, obj):
         if obj.instructor:
@@ -396,35 +575,57 @@ class CourseSerializer(serializers.ModelSerializer):
         return None
     
     def get_modules(self, obj):
-        modules = obj.modules.all().prefetch_related('lessons')
-        return CourseModuleSerializer(modules, many=True).data
+        modules = obj.modules.all()
+        if 'modules' not in getattr(obj, '_prefetched_objects_cache', {}):
+            # Not prefetched by the view: fetch what the shape needs for this course's modules
+            lookups = shape_prefetches(get_shape(self.context), MODULE_RELATIONS, 'modules')
+            modules = modules.prefetch_related(*[lookup[len('modules__'):] for lookup in lookups])
+        return CourseModuleSerializer(modules, many=True, context={**self.context, 'shape_prefix': 'modules'}).data
     
     def get_total_lessons(self, obj):
-        return obj.lessons.count()
+        return obj.lesson_count
     
     def get_progress_percent(self, obj):
-        user = self.context['request'].user
-        if not user.is_authenticated:
+        request = self.context.get('request')
+        if request is None or not request.user.is_authenticated:
             return None  # or 0
+        user = request.user
         
-        total_lessons = Lesson.objects.filter(
-            module__course=obj
-        ).count()
+        total_lessons = obj.lesson_count
 
         if total_lessons == 0:
             return 0
 
-        completed_lessons = LessonProgress.objects.filter(
-            student=user,
-            lesson__module__course=obj,
-            completed=True
-        ).count()
+        # Views listing many courses pass {course_id: completed} to avoid a count per course
+        completed_counts = self.context.get('completed_counts')
+        if completed_counts is not None:
+            completed_lessons = completed_counts.get(obj.id, 0)
+        else:
+            completed_lessons = LessonProgress.objects.filter(
+                student=user,
+                lesson__course=obj,
+                completed=True
+            ).count()
 
         return round((completed_lessons / total_lessons) * 100)
     
     def get_completed_lessons(self, obj):
         return list(self.context.get('completed_lessons', set()))
 
+class CourseCatalogSerializer(serializers.ModelSerializer):
+    """Light catalog card. Expects the queryset from PublicCourseListView (annotated, instructor joined)"""
+    instructor_details = InstructorSerializer(source='instructor', read_only=True)
+    total_lessons = serializers.IntegerField(source='lesson_count', read_only=True)
+    total_duration = serializers.IntegerField(source='duration', read_only=True)
+
+    class Meta:
+        model = Course
+        fields = ["id", "title", "description", "price", "intro_video_id",
+                  "instructor", "instructor_details", "created_at", "category",
+                  "duration", "rating", "total_lessons", "total_duration",
+                  "quiz_count", "enrollment_count"]
+        read_only_fields = fields
+
 class CourseDetailSerializer(serializers.ModelSerializer):
     lessons = LessonSerializer(many=True, read_only=True)
     requirements = CourseRequirementSerializer(many=True, read_only=True)
@@ -433,7 +634,11 @@ class CourseDetailSerializer(serializers.ModelSerializer):
     modules = serializers.SerializerMethodField()
     class Meta:
         model = Course
-        fields = '__all__'
+        # Listed explicitly so bookkeeping columns (versions, counters) stay out of the public tree.
+        # Enrollments don't bump the content version, so their count is left out of cached trees too
+        fields = ['id', 'lessons', 'requirements', 'outcomes', 'instructor_details', 'modules', 'title',
+                  'description', 'price', 'intro_video_id', 'created_at', 'category', 'duration', 'rating',
+                  'is_published', 'instructor']
 
     def get_instructor_details(self, obj):
         if obj.instructor:
@@ -441,8 +646,7 @@ class CourseDetailSerializer(serializers.ModelSerializer):
         return None
     
     def get_modules(self, obj):
-        modules = obj.modules.all().prefetch_related('lessons')
-        return CourseModuleSerializer(modules, many=True).data
+        return CourseModuleSerializer(obj.modules.all(), many=True).data
 
 class BulkCourseOutcomeSerializer(serializers.Serializer):
     course = serializers.IntegerField()
@@ -485,3 +689,18 @@ class BulkCourseRequirementSerializer(serializers.Serializer):
             if not isinstance(req.get('position', 0), int):
                 raise serializers.ValidationError("Position must be an integer")
         return data
+
+
+# Nested relations emitted by the serializers above, for shape_prefetches()
+LESSON_RELATIONS = {
+    'quizzes': {'questions': {}},
+    'assignments': {},
+    'contents': {},
+    'resources': {},
+}
+MODULE_RELATIONS = {'lessons': LESSON_RELATIONS}
+COURSE_RELATIONS = {
+    'modules': MODULE_RELATIONS,
+    'outcomes': {},
+    'requirements': {},
+}
@@ -0,0 +1,208 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .aggregates import adjust_course_aggregates, rebuild_course_aggregates, roll_up_duration
+from .caching import bump_course_version
+from .search import index_course
+from .snapshots import refresh_snapshots
+from .static_catalog import on_publish
+from .attempts import refresh_summary
+from .serializers import InstructorSerializer
+from .models import (Course, CourseSnapshot, CourseModule, Lesson, LessonContent, Resource,
+                     Quiz, Question, QuestionPool, QuizAttempt, Assignment, CourseOutcome, CourseRequirement, Enrollment)
+
+
+def _course_id_for(instance):
+    if isinstance(instance, Course):
+        return instance.pk
+    if not isinstance(instance, (LessonContent, Resource, Assignment, Question)):
+        return instance.course_id
+    if not hasattr(instance, '_course_id'):
+        # Memoized so the handlers below share one lookup per save
+        if isinstance(instance, Question):
+            instance._course_id = Quiz.objects.filter(pk=instance.quiz_id).values_list('course_id', flat=True).first()
+        else:
+            instance._course_id = Lesson.objects.filter(pk=instance.lesson_id).values_list('course_id', flat=True).first()
+    return instance._course_id
+
+
+def _loaded_course_id(instance):
+    """The course an instance was loaded with, which differs from course_id after a move"""
+    return getattr(instance, '_loaded_course_id', instance.course_id)
+
+
+@receiver(pre_save, sender=Course)
+def touch_course(sender, instance, **kwargs):
+    # Course rows carry their own version, so bump it in the same write
+    if instance.pk is not None:
+        instance.content_version = F('content_version') + 1
+        instance.content_updated_at = timezone.now()
+
+
+@receiver(post_save, sender=Course)
+def reload_course_version(sender, instance, created, **kwargs):
+    if not created:
+        instance.refresh_from_db(fields=['content_version'])
+
+
+# Every other model that is part of a serialized course tree
+@receiver(post_save, sender=CourseModule)
+@receiver(post_save, sender=Lesson)
+@receiver(post_save, sender=LessonContent)
+@receiver(post_save, sender=Resource)
+@receiver(post_save, sender=Quiz)
+@receiver(post_save, sender=Question)
+@receiver(post_save, sender=Assignment)
+@receiver(post_save, sender=CourseOutcome)
+@receiver(post_save, sender=CourseRequirement)
+@receiver(post_delete, sender=CourseModule)
+@receiver(post_delete, sender=Lesson)
+@receiver(post_delete, sender=LessonContent)
+@receiver(post_delete, sender=Resource)
+@receiver(post_delete, sender=Quiz)
+@receiver(post_delete, sender=Question)
+@receiver(post_delete, sender=Assignment)
+@receiver(post_delete, sender=CourseOutcome)
+@receiver(post_delete, sender=CourseRequirement)
+def invalidate_course_tree(sender, instance, **kwargs):
+    course_id = _course_id_for(instance)
+    if course_id is not None:
+        bump_course_version(course_id)
+    if isinstance(instance, (Lesson, Quiz)) and _loaded_course_id(instance) != course_id:
+        # Moved: the course it left changed too
+        bump_course_version(_loaded_course_id(instance))
+
+
+# Course trees embed the instructor's profile (instructor_details)
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def touch_instructor_courses(sender, instance, created, update_fields=None, **kwargs):
+    if created or (update_fields is not None and not set(update_fields) & set(InstructorSerializer.Meta.fields)):
+        return  # e.g. a login only writes last_login
+    Course.objects.filter(instructor_id=instance.pk).update(
+        content_version=F('content_version') + 1,
+        content_updated_at=timezone.now(),
+    )
+
+
+# Answer keys and take payloads are cached per quiz version
+@receiver(post_save, sender=Quiz)
+def touch_quiz(sender, instance, created, **kwargs):
+    if not created:
+        Quiz.objects.filter(pk=instance.pk).update(version=F('version') + 1)
+
+
+@receiver(post_save, sender=Question)
+@receiver(post_delete, sender=Question)
+@receiver(post_save, sender=QuestionPool)
+@receiver(post_delete, sender=QuestionPool)
+def bump_quiz_version(sender, instance, **kwargs):
+    Quiz.objects.filter(pk=instance.quiz_id).update(version=F('version') + 1)
+
+
+# Attempts are only ever created through attempts.record_attempt, which keeps the summary
+@receiver(post_delete, sender=QuizAttempt)
+def resummarize_attempts(sender, instance, **kwargs):
+    refresh_summary(instance.student_id, instance.quiz_id)
+
+
+# Search index: only the models whose text is indexed
+@receiver(post_save, sender=Course)
+@receiver(post_delete, sender=Course)
+@receiver(post_save, sender=CourseOutcome)
+@receiver(post_delete, sender=CourseOutcome)
+@receiver(post_save, sender=Lesson)
+@receiver(post_delete, sender=Lesson)
+def reindex_course(sender, instance, **kwargs):
+    index_course(_course_id_for(instance))
+    if isinstance(instance, Lesson) and _loaded_course_id(instance) != instance.course_id:
+        index_course(_loaded_course_id(instance))  # drop the moved lesson's title from the old course
+
+
+# Denormalized course counters
+COUNTERS = {Lesson: 'lesson_count', Quiz: 'quiz_count', Enrollment: 'enrollment_count'}
+
+
+@receiver(post_save, sender=Lesson)
+@receiver(post_save, sender=Quiz)
+@receiver(post_save, sender=Enrollment)
+def count_saved(sender, instance, created, **kwargs):
+    counter = COUNTERS[sender]
+    if created:
+        adjust_course_aggregates(instance.course_id, **{counter: 1})
+    elif _loaded_course_id(instance) != instance.course_id:
+        adjust_course_aggregates(_loaded_course_id(instance), **{counter: -1})
+        adjust_course_aggregates(instance.course_id, **{counter: 1})
+
+
+@receiver(post_delete, sender=Lesson)
+@receiver(post_delete, sender=Quiz)
+@receiver(post_delete, sender=Enrollment)
+def count_deleted(sender, instance, **kwargs):
+    adjust_course_aggregates(instance.course_id, **{COUNTERS[sender]: -1})
+
+
+# Public snapshots: dropped when a course is unpublished, recompiled once a save of a
+# published course commits (so it sees the committed rows). Curriculum edits only bump
+# the content version; the public detail view recompiles stale snapshots when read.
+@receiver(post_save, sender=Course)
+def sync_course_snapshot(sender, instance, **kwargs):
+    if not instance.is_published:
+        deleted, _ = CourseSnapshot.objects.filter(pk=instance.pk).delete()
+        if deleted:
+            on_publish(instance.pk)
+    else:
+        course_id = instance.pk
+        transaction.on_commit(lambda: refresh_snapshots(Course.objects.filter(pk=course_id)))
+        on_publish(course_id)
+
+
+# Durations roll up from contents. Lesson and module deletes need nothing here:
+# their contents are cascade-deleted first and subtract themselves.
+def _roll_up_content(instance, delta):
+    if not delta:
+        return
+    # Not memoized: the lesson may have moved module since this instance was last saved
+    course_id, module_id = Lesson.objects.filter(pk=instance.lesson_id).values_list('course_id', 'module_id').first() or (None, None)
+    instance._course_id = course_id
+    roll_up_duration(delta, instance.lesson_id, module_id, course_id)
+
+
+@receiver(post_save, sender=LessonContent)
+def roll_up_content_duration(sender, instance, created, **kwargs):
+    if created:
+        _roll_up_content(instance, instance.duration)
+    elif getattr(instance, '_loaded_duration', None) is not None:
+        _roll_up_content(instance, instance.duration - instance._loaded_duration)
+    else:
+        # Saved without having been loaded, so the old value is unknown
+        rebuild_course_aggregates(Course.objects.filter(pk=_course_id_for(instance)))
+    instance._loaded_duration = instance.duration
+
+
+@receiver(post_delete, sender=LessonContent)
+def drop_content_duration(sender, instance, **kwargs):
+    _roll_up_content(instance, -instance.duration)
+
+
+@receiver(post_save, sender=Lesson)
+def move_lesson_duration(sender, instance, created, **kwargs):
+    old_module_id = getattr(instance, '_loaded_module_id', instance.module_id)
+    old_course_id = _loaded_course_id(instance)
+    if not created and (old_module_id, old_course_id) != (instance.module_id, instance.course_id):
+        # instance.duration may be stale; the stored one is what the modules and courses hold
+        duration = Lesson.objects.filter(pk=instance.pk).values_list('duration', flat=True).first() or 0
+        moved_course = old_course_id != instance.course_id
+        roll_up_duration(-duration, module_id=old_module_id, course_id=old_course_id if moved_course else None)
+        roll_up_duration(duration, module_id=instance.module_id, course_id=instance.course_id if moved_course else None)
+    instance._loaded_module_id = instance.module_id
+
+
+# Registered last, so every handler above still sees the course a lesson or quiz moved from
+@receiver(post_save, sender=Lesson)
+@receiver(post_save, sender=Quiz)
+def remember_course(sender, instance, **kwargs):
+    instance._loaded_course_id = instance.course_id
@@ -0,0 +1,71 @@
+"""
+Published-course snapshots.
+
+Publishing a course compiles its public detail tree once into a CourseSnapshot
+row, so the public detail endpoint is a single primary-key read no matter how
+deep the curriculum is. A snapshot records the course content_version it was
+compiled from and is only served while that still matches; edits bump the
+version, and the next read (or save of the course, or catalog sync) compiles
+a fresh one. Drafts have no snapshot and keep reading the live tables.
+"""
+import hashlib
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Course, CourseSnapshot
+from .serializers import CourseDetailSerializer
+from .tree import build_course_tree
+
+
+def compile_snapshot(course_id):
+    """(Re)compile the snapshot of a course and return it"""
+    course = Course.objects.select_related('instructor').get(pk=course_id)
+    # No request in the context, so file urls stay relative: the document is shared by every host.
+    # It's public (and copied to the static catalog), so questions leave out their answers
+    tree = build_course_tree(course, CourseDetailSerializer, answers=False)
+    document = json.loads(json.dumps(tree, cls=DjangoJSONEncoder))
+    canonical = json.dumps(document, sort_keys=True, separators=(',', ':'))
+    snapshot, _ = CourseSnapshot.objects.update_or_create(
+        course_id=course_id,
+        defaults={
+            'document': document,
+            'content_hash': hashlib.sha256(canonical.encode()).hexdigest(),
+            'content_version': course.content_version,
+            'compiled_at': timezone.now(),
+        },
+    )
+    return snapshot
+
+
+def current_snapshot(course_id):
+    """The snapshot of a published course, recompiled first if the course changed since"""
+    snapshot = CourseSnapshot.objects.filter(pk=course_id, content_version=F('course__content_version')).first()
+    return snapshot or compile_snapshot(course_id)
+
+
+def stale_courses(courses=None):
+    """Published courses (of `courses`) whose snapshot is missing or older than their content"""
+    courses = Course.objects.all() if courses is None else courses
+    return courses.filter(is_published=True).filter(
+        Q(snapshot__isnull=True) | Q(snapshot__content_version__lt=F('content_version'))
+    )
+
+
+def refresh_snapshots(courses=None):
+    """Recompile the stale snapshots (of `courses`). Returns the number compiled"""
+    course_ids = list(stale_courses(courses).values_list('id', flat=True))
+    for course_id in course_ids:
+        compile_snapshot(course_id)
+    return len(course_ids)
+
+
+def rebuild_snapshots():
+    """Compile every published course and drop stray snapshots. Returns the number compiled"""
+    CourseSnapshot.objects.filter(course__is_published=False).delete()
+    course_ids = list(Course.objects.filter(is_published=True).values_list('id', flat=True))
+    for course_id in course_ids:
+        compile_snapshot(course_id)
+    return len(course_ids)
@@ -0,0 +1,117 @@
+"""
+Pre-rendered static catalog.
+
+Writes the public course list and every published course's snapshot (see
+snapshots.py) as pre-compressed JSON under STATIC_CATALOG_ROOT, so anonymous
+catalog traffic can be served by the web server or a CDN:
+
+    courses.json.gz          published courses, newest first (catalog cards)
+    courses/<id>.json.gz     one course's public detail tree
+    manifest.json            content hash and version of every file
+
+e.g. with nginx:  location /catalog/ { alias .../catalog/; gzip_static always; gunzip on; }
+
+Syncing is incremental: a course file is only rewritten when its snapshot hash
+differs from the manifest, and files of unpublished courses are removed.
+"""
+import gzip
+import hashlib
+import json
+import os
+from pathlib import Path
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Course, CourseSnapshot
+from .serializers import CourseCatalogSerializer
+from .snapshots import refresh_snapshots
+
+INDEX_FILE = 'courses.json.gz'
+MANIFEST_FILE = 'manifest.json'
+
+
+def _encode(document):
+    return json.dumps(document, cls=DjangoJSONEncoder, separators=(',', ':')).encode()
+
+
+def _write(path, data):
+    # Write then rename, so the web server never serves a half-written file
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temp = path.with_name(path.name + '.tmp')
+    temp.write_bytes(data)
+    os.replace(temp, path)
+
+
+def _gzip(data):
+    return gzip.compress(data, compresslevel=9, mtime=0)  # mtime=0: same content, same bytes
+
+
+def read_manifest(root):
+    try:
+        manifest = json.loads((root / MANIFEST_FILE).read_text())
+    except (FileNotFoundError, ValueError):
+        manifest = {}
+    manifest.setdefault('courses', {})
+    return manifest
+
+
+def course_path(course_id):
+    return f'courses/{course_id}.json.gz'
+
+
+def sync_catalog(course_ids=None, root=None, force=False):
+    """
+    Bring the static files up to date; `course_ids` limits the course files
+    checked (the index is always checked). Returns (written, removed) course files.
+    """
+    root = Path(root or settings.STATIC_CATALOG_ROOT)
+    manifest = {'courses': {}} if force else read_manifest(root)
+    entries = manifest['courses']
+
+    published = Course.objects.filter(is_published=True)
+    if course_ids is not None:
+        published = published.filter(pk__in=course_ids)
+    # Snapshots missing (courses published before snapshots existed) or behind the course's content
+    refresh_snapshots(published)
+
+    if course_ids is None:
+        stale = set(entries)
+    else:
+        stale = {str(course_id) for course_id in course_ids} & set(entries)
+    written = 0
+    snapshots = CourseSnapshot.objects.filter(course__in=published).values_list('course_id', 'content_hash', 'content_version')
+    for course_id, content_hash, content_version in snapshots:
+        key = str(course_id)
+        stale.discard(key)
+        path = course_path(course_id)
+        if entries.get(key, {}).get('hash') == content_hash and (root / path).exists():
+            continue
+        document = CourseSnapshot.objects.values_list('document', flat=True).get(pk=course_id)
+        _write(root / path, _gzip(_encode(document)))
+        entries[key] = {'file': path, 'hash': content_hash, 'version': content_version}
+        written += 1
+    for key in stale:
+        (root / entries.pop(key)['file']).unlink(missing_ok=True)
+
+    # Same order as the first page of the public list
+    cards = CourseCatalogSerializer(
+        Course.objects.filter(is_published=True).select_related('instructor').order_by('-created_at', '-id'), many=True
+    ).data
+    index = _encode({'results': cards})
+    index_hash = hashlib.sha256(index).hexdigest()
+    if manifest.get('index', {}).get('hash') != index_hash or not (root / INDEX_FILE).exists():
+        _write(root / INDEX_FILE, _gzip(index))
+        manifest['index'] = {'file': INDEX_FILE, 'hash': index_hash}
+
+    manifest['generated_at'] = timezone.now().isoformat()
+    _write(root / MANIFEST_FILE, json.dumps(manifest, indent=2, sort_keys=True).encode())
+    return written, len(stale)
+
+
+def on_publish(course_id):
+    """Publish hook: refresh one course's static files once the publishing transaction commits"""
+    if settings.STATIC_CATALOG_ON_PUBLISH:
+        transaction.on_commit(lambda: sync_catalog([course_id]))
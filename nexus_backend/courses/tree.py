@@ -0,0 +1,242 @@
+"""
+Single-pass builder for the course detail trees.
+
+Every table under a course is read once with a flat values() query, grouped
+by parent id in memory, and each node is formatted exactly once using the
+existing serializers' field definitions, so the output matches them. A lesson
+dict is shared between a course's flat `lessons` list and `modules[].lessons`.
+"""
+from collections import defaultdict
+
+from django.db.models import Count
+from rest_framework import serializers
+
+from .attempts import attempts_taken
+from .models import (
+    Assignment, CourseModule, CourseOutcome, CourseRequirement, Lesson,
+    LessonContent, Question, Quiz, QuizAttemptSummary, Resource
+)
+from .serializers import (
+    AssignmentSerializer, CourseModuleSerializer, CourseOutcomeSerializer,
+    CourseRequirementSerializer, LessonContentSerializer, LessonSerializer,
+    QuestionSerializer, QuestionTakeSerializer, QuizSerializer, ResourceSerializer
+)
+
+
+class RowFormatter:
+    """
+    Formats values() rows with a serializer's own fields (already pruned to the
+    Shape at `path`). Method, dotted-source and nested fields aren't read from
+    the row; callers pass them to format() instead.
+    """
+
+    def __init__(self, serializer_class, shape=None, path=''):
+        self.fields = list(serializer_class(context={'shape': shape, 'shape_prefix': path}).fields.items())
+        self.names = {name for name, _ in self.fields}
+        self.sources = [field.source for name, field in self.fields if self.is_column(field)]
+
+    @staticmethod
+    def is_column(field):
+        return not isinstance(field, (serializers.SerializerMethodField, serializers.BaseSerializer)) \
+            and field.source != '*' and '.' not in field.source
+
+    def wants(self, name):
+        return name in self.names
+
+    def columns(self, *required):
+        return list(dict.fromkeys([*required, *self.sources]))
+
+    def format(self, row, **computed):
+        data = {}
+        for name, field in self.fields:
+            if name in computed:
+                data[name] = computed[name]
+                continue
+            value = row[field.source]
+            if value is None or isinstance(field, serializers.RelatedField):
+                data[name] = value  # values() already gives the pk
+            else:
+                data[name] = field.to_representation(value)
+        return data
+
+
+def build_course_tree(course, serializer_class, shape=None, user=None, context=None, answers=True):
+    """
+    Serialize `course` with `serializer_class` (CourseSerializer or CourseDetailSerializer),
+    assembling modules/lessons/outcomes/requirements here instead of through nested serializers.
+    Per-user quiz fields are filled for `user`; pass None for trees shared between users.
+    With answers=False questions are formatted like QuestionTakeSerializer, without the answer key.
+    """
+    context = {**(context or {}), 'shape': shape}
+    root = serializer_class(course, context=context)
+    order = list(root.fields)
+    nested = [name for name in ('modules', 'lessons', 'outcomes', 'requirements') if name in root.fields]
+    for name in nested:
+        root.fields.pop(name)
+    built = dict(root.data)
+
+    if 'outcomes' in nested:
+        built['outcomes'] = flat_nodes(CourseOutcomeSerializer, CourseOutcome.objects.filter(course=course), shape, 'outcomes')
+    if 'requirements' in nested:
+        built['requirements'] = flat_nodes(CourseRequirementSerializer, CourseRequirement.objects.filter(course=course), shape, 'requirements')
+
+    if 'modules' in nested or 'lessons' in nested:
+        lesson_path = 'modules.lessons' if 'modules' in nested else 'lessons'
+        lessons = lesson_nodes({'course_id': course.id}, shape, lesson_path, user, context, answers)
+        if 'lessons' in nested:
+            built['lessons'] = [node for _, node in lessons]
+        if 'modules' in nested:
+            built['modules'] = module_nodes(course.id, lessons, shape)
+
+    return {name: built[name] for name in order}
+
+
+def build_lesson_tree(lesson_id, shape=None, user=None, context=None):
+    """One lesson with its nested relations, shaped like LessonSerializer; None if it doesn't exist"""
+    nodes = lesson_nodes({'id': lesson_id}, shape, '', user, context or {})
+    return nodes[0][1] if nodes else None
+
+
+def within(relation, scope):
+    """Re-root a Lesson filter (e.g. {'course_id': 1}) under `relation`"""
+    return {f'{relation}__{key}': value for key, value in scope.items()}
+
+
+def flat_nodes(serializer_class, queryset, shape, path):
+    formatter = RowFormatter(serializer_class, shape, path)
+    return [formatter.format(row) for row in queryset.values(*formatter.columns())]
+
+
+def module_nodes(course_id, lessons, shape):
+    formatter = RowFormatter(CourseModuleSerializer, shape, 'modules')
+    by_module = defaultdict(list)
+    for row, node in lessons:
+        by_module[row['module']].append((row, node))
+    nodes = []
+    for row in CourseModule.objects.filter(course_id=course_id).values(*formatter.columns('id')):
+        computed = {}
+        if formatter.wants('lessons'):
+            computed['lessons'] = [node for _, node in by_module.get(row['id'], [])]
+        nodes.append(formatter.format(row, **computed))
+    return nodes
+
+
+def lesson_nodes(scope, shape, path, user, context, answers=True):
+    """[(row, node)] for the lessons matching `scope`, in position order"""
+    formatter = RowFormatter(LessonSerializer, shape, path)
+    rows = list(Lesson.objects.filter(**scope).values(*formatter.columns('id', 'module')))
+    children = {}
+    if formatter.wants('contents'):
+        children['contents'] = child_nodes(LessonContentSerializer, LessonContent.objects.filter(**within('lesson', scope)), shape, f'{path}.contents')
+    if formatter.wants('resources'):
+        children['resources'] = child_nodes(ResourceSerializer, Resource.objects.filter(**within('lesson', scope)), shape, f'{path}.resources')
+    if formatter.wants('quizzes'):
+        children['quizzes'] = quiz_nodes(scope, shape, f'{path}.quizzes', user, answers)
+    if formatter.wants('assignments'):
+        # FileField needs a model instance (and the request) to build its url, so these skip values()
+        assignments = AssignmentSerializer(Assignment.objects.filter(**within('lesson', scope)), many=True, context=context).data
+        children['assignments'] = defaultdict(list)
+        for node in assignments:
+            children['assignments'][node['lesson']].append(node)
+    return [
+        (row, formatter.format(row, **{name: groups.get(row['id'], []) for name, groups in children.items()}))
+        for row in rows
+    ]
+
+
+def child_nodes(serializer_class, queryset, shape, path):
+    """Leaf nodes grouped by lesson id"""
+    formatter = RowFormatter(serializer_class, shape, path)
+    groups = defaultdict(list)
+    for row in queryset.values(*formatter.columns('lesson')):
+        groups[row['lesson']].append(formatter.format(row))
+    return groups
+
+
+def quiz_nodes(scope, shape, path, user, answers=True):
+    """Quiz nodes grouped by lesson id, with questions and the user's attempt counts"""
+    formatter = RowFormatter(QuizSerializer, shape, path)
+    quizzes = Quiz.objects.filter(**within('lesson', scope))
+    questions = None
+    if formatter.wants('questions'):
+        question_serializer = QuestionSerializer if answers else QuestionTakeSerializer
+        question_formatter = RowFormatter(question_serializer, shape, f'{path}.questions')
+        questions = defaultdict(list)
+        for row in Question.objects.filter(**within('quiz__lesson', scope)).values(*question_formatter.columns('quiz')):
+            questions[row['quiz']].append(question_formatter.format(row))
+    elif formatter.wants('total_questions'):
+        quizzes = quizzes.annotate(question_total=Count('questions'))
+    signed_in = user is not None and user.is_authenticated
+    attempts = {}
+    if signed_in and formatter.names & {'attempts_count', 'can_attempt', 'attempts_remaining'}:
+        attempts = dict(
+            QuizAttemptSummary.objects.filter(student=user, **within('quiz__lesson', scope))
+            .values_list('quiz', 'attempts_count')
+        )
+
+    columns = formatter.columns('id', 'lesson', 'is_active', 'max_attempts')
+    if questions is None and formatter.wants('total_questions'):
+        columns.append('question_total')
+    groups = defaultdict(list)
+    for row in quizzes.values(*columns):
+        computed = attempt_fields(row, attempts.get(row['id'], 0), signed_in)
+        if questions is not None:
+            computed['questions'] = questions.get(row['id'], [])
+            computed['total_questions'] = len(computed['questions'])
+        elif formatter.wants('total_questions'):
+            computed['total_questions'] = row['question_total']
+        groups[row['lesson']].append(formatter.format(row, **computed))
+    return groups
+
+
+def attempt_fields(quiz, taken, signed_in):
+    """QuizSerializer's per-user fields, given how many attempts the user has made"""
+    open_to_user = signed_in and quiz['is_active']
+    return {
+        'attempts_count': taken if signed_in else 0,
+        'can_attempt': taken < quiz['max_attempts'] if open_to_user else False,
+        'attempts_remaining': max(0, quiz['max_attempts'] - taken) if open_to_user else 0,
+    }
+
+
+def overlay_quiz_attempts(lesson, user, taken=None):
+    """
+    Fill the per-user quiz fields of a lesson node that was built without a user.
+    `taken` ({quiz id: attempts}) saves the lookup when overlaying many lessons.
+    """
+    quizzes = lesson.get('quizzes')
+    if not quizzes:
+        return lesson
+    if taken is None:
+        taken = attempts_taken(user, [quiz['id'] for quiz in quizzes if 'id' in quiz])
+    return {**lesson, 'quizzes': [overlay_quiz(quiz, taken, user.is_authenticated) for quiz in quizzes]}
+
+
+def overlay_quiz(quiz, taken, signed_in):
+    # Shapes can prune the fields attempt_fields() needs; such nodes are left as built
+    if not {'id', 'is_active', 'max_attempts'} <= quiz.keys():
+        return quiz
+    fields = attempt_fields(quiz, taken.get(quiz['id'], 0), signed_in)
+    return {**quiz, **{name: value for name, value in fields.items() if name in quiz}}
+
+
+def overlay_course_quiz_attempts(course, user, taken=None):
+    """overlay_quiz_attempts() for every lesson of a course node, with at most one summary query"""
+    lessons = list(course.get('lessons') or []) + [
+        lesson for module in course.get('modules') or [] for lesson in module.get('lessons') or []
+    ]
+    quiz_ids = {quiz['id'] for lesson in lessons for quiz in lesson.get('quizzes') or [] if 'id' in quiz}
+    if not quiz_ids:
+        return course
+    if taken is None:
+        taken = attempts_taken(user, quiz_ids)
+    course = dict(course)
+    if 'lessons' in course:
+        course['lessons'] = [overlay_quiz_attempts(lesson, user, taken) for lesson in course['lessons']]
+    if 'modules' in course:
+        course['modules'] = [
+            {**module, 'lessons': [overlay_quiz_attempts(lesson, user, taken) for lesson in module['lessons']]}
+            if 'lessons' in module else module
+            for module in course['modules']
+        ]
+    return course
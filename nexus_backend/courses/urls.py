@@ -6,18 +6,18 @@ from .views import (
     
     # Quiz 
     QuizListCreateView, QuizDetailView,
-    QuestionListCreateView, QuestionDetailView,
+    QuestionListCreateView, QuestionDetailView, QuestionImportView,
     LessonQuizzesView, QuizTakeView, QuizSubmitView,
-    QuizAttemptListView, QuizAttemptDetailView, QuizResultsView,
+    QuizAttemptListView, QuizAttemptDetailView, QuizResultsView, QuizItemAnalysisView, QuizStatisticsView,
 
     # Course 
-    PublicCourseListView, PublicCourseDetailView, InstructorCourseListView, 
-    InstructorCourseDetailView, BulkCourseOutcomeView, BulkCourseRequirementView, 
+    PublicCourseListView, PublicCourseDetailView, CourseSearchView, InstructorCourseListView, 
+    InstructorCourseDetailView, CourseExportView, CourseImportView, CourseDuplicateView, CoursePublishView, BulkCourseOutcomeView, BulkCourseRequirementView, 
     CourseOutcomeListCreateView, CourseOutcomeDetailView, CourseRequirementListCreateView, 
     CourseRequirementDetailView,CourseSpecificLessons,
 
     # Module
-    ModuleCreateView, ModuleDetailView, ModuleReorderView,
+    ModuleCreateView, ModuleDetailView, ModuleReorderView, ReorderView,
 
     # Lesson 
     LessonListCreateView, LessonDetailView, LessonProgressView, 
@@ -25,6 +25,7 @@ from .views import (
 
     # Enrollment
     EnrollmentView, EnrollmentCheckView, EnrolledCourseDetailView, 
+    EnrolledCourseOutlineView, EnrolledLessonContentView,
     EnrollmentProgressView, CompleteLessonView, 
 
     # Payment
@@ -63,12 +64,15 @@ quiz_patterns = [
     # Question CRUD
     path('questions/', QuestionListCreateView.as_view(), name='question-list-create'),
     path('questions/<int:pk>/', QuestionDetailView.as_view(), name='question-detail'),
+    path('quizzes/<int:quiz_id>/questions/import/', QuestionImportView.as_view(), name='question-import'),
     
     # Quiz taking and submission
     path('lessons/<int:lesson_id>/quizzes/', LessonQuizzesView.as_view(), name='lesson-quizzes'),
     path('quizzes/<int:quiz_id>/take/', QuizTakeView.as_view(), name='quiz-take'),
     path('quizzes/<int:quiz_id>/submit/', QuizSubmitView.as_view(), name='quiz-submit'),
     path('quizzes/<int:quiz_id>/results/', QuizResultsView.as_view(), name='quiz_results'),
+    path('quizzes/<int:quiz_id>/item-analysis/', QuizItemAnalysisView.as_view(), name='quiz-item-analysis'),
+    path('quizzes/<int:quiz_id>/statistics/', QuizStatisticsView.as_view(), name='quiz-statistics'),
     
     # Quiz attempts
     path('quizzes/<int:quiz_id>/attempts/', QuizAttemptListView.as_view(), name='quiz-attempts'),
@@ -79,11 +83,16 @@ quiz_patterns = [
 course_patterns = [
     # Public Course View
     path("courses/", PublicCourseListView.as_view(), name="course-list"),
+    path("courses/search/", CourseSearchView.as_view(), name="course-search"),
     path("courses/<int:pk>/", PublicCourseDetailView.as_view(), name="course-detail"),
 
     # Instructor Course View
     path("instructor/courses/", InstructorCourseListView.as_view(), name="course-list"),
     path("instructor/courses/<int:pk>/", InstructorCourseDetailView.as_view(), name="course-detail"),
+    path("instructor/courses/<int:pk>/export/", CourseExportView.as_view(), name="course-export"),
+    path("instructor/courses/import/", CourseImportView.as_view(), name="course-import"),
+    path("instructor/courses/<int:pk>/duplicate/", CourseDuplicateView.as_view(), name="course-duplicate"),
+    path("instructor/courses/<int:pk>/publish/", CoursePublishView.as_view(), name="course-publish"),
 
     # Course CRUD patterns
     path("courses/outcomes/bulk-create/", BulkCourseOutcomeView.as_view(), name="bulk-course-outcomes"),
@@ -110,12 +119,17 @@ urlpatterns = [
     path("lessons/", LessonListCreateView.as_view(), name="lesson-list"),
     path("lessons/<int:pk>/", LessonDetailView.as_view(), name="lesson-detail"),
     path("lessons/<int:lesson_id>/resources/", LessonResourcesView.as_view(), name="lesson-resources"),
+    path("lessons/reorder/", ReorderView.as_view(kind='lessons'), name="lesson-reorder"),
+    path("lessons/contents/reorder/", ReorderView.as_view(kind='contents'), name="lesson-content-reorder"),
+    path("resources/reorder/", ReorderView.as_view(kind='resources'), name="resource-reorder"),
     
     path("resources/<int:pk>/", ResourceDetailView.as_view(), name="resource-detail"),
 
     # Enrollment Pattern
     path("enrollments/check/<int:course_id>/", EnrollmentCheckView.as_view(), name="enrollment-check"),
     path("enrollments/course/<int:course_id>/", EnrolledCourseDetailView.as_view(), name="enrolled-course-detail"),
+    path("enrollments/course/<int:course_id>/outline/", EnrolledCourseOutlineView.as_view(), name="enrolled-course-outline"),
+    path("enrollments/lessons/<int:lesson_id>/content/", EnrolledLessonContentView.as_view(), name="enrolled-lesson-content"),
     path("enrollments/progress/<int:course_id>/", EnrollmentProgressView.as_view(), name="enrollment-progress"),  
     path("enrollments/complete-lesson/", CompleteLessonView.as_view(), name="complete-lesson"),
     path("enroll/", EnrollmentView.as_view(), name="enroll-course"),
@@ -3,29 +3,49 @@ from rest_framework.exceptions import PermissionDenied, NotFound
 from django.contrib.auth.mixins import LoginRequiredMixin
 from rest_framework import status
 from django.shortcuts import get_object_or_404
+from django.http import StreamingHttpResponse
 from rest_framework.views import APIView
 from rest_framework.permissions import IsAuthenticated
 
 from django.db.models import Max
 from .permissions import IsCreatorOrEnrolled, IsQuizInstructor, IsCourseInstructor
+from .caching import get_cached_course_tree, get_cached_quiz_build, make_etag, not_modified, set_validators
+from .filters import CourseCatalogFilter
+from .search import search_course_ids
+from .tree import (attempt_fields, build_course_tree, build_lesson_tree, overlay_course_quiz_attempts,
+                   overlay_quiz_attempts)
+from .ordering import merged_order, reorder
+from .bundle import clone_course, export_course, import_course
+from .snapshots import compile_snapshot, current_snapshot
+from .static_catalog import on_publish
+from .grading import answer_rows, get_answer_key, grade
+from .question_import import guess_format, import_questions, parse_questions
+from .papers import build_paper, paper_key, paper_payload, shown_results, to_quiz_answers, uses_papers
+from .attempts import AttemptLimitReached, attempts_taken, course_attempts, record_attempt
+from .analytics import item_analysis, quiz_statistics
+from .pagination import (CreatedAtCursorPagination, EnrolledAtCursorPagination,
+                         StartedAtCursorPagination, IdCursorPagination)
 from django.utils import timezone
 from django.db import transaction
-from django.db.models import Prefetch, OuterRef
+from django.db.models import Prefetch, OuterRef, Subquery, Count, F, FilteredRelation, Q, Sum
+from django.db.models.functions import Coalesce
 from django.utils.timezone import now
 from rest_framework.response import Response
 from .models import (Course, Lesson, Assignment, 
                      Enrollment, LessonProgress, CourseRequirement, 
                      CourseOutcome, CourseModule, Quiz, LessonContent,
-                     Question, QuizAttempt, Resource)
+                     Question, QuizAttempt, QuizAttemptAnswer, Resource, QuizAttemptSummary)
 from .serializers import (
-    CourseSerializer, LessonSerializer, AssignmentSerializer, 
+    CourseSerializer, CourseCatalogSerializer, LessonSerializer, AssignmentSerializer, 
     EnrollmentSerializer, LessonProgressSerializer, CourseDetailSerializer, 
     ModuleCreateSerializer, QuestionSerializer,LessonContentSerializer, ResourceSerializer,
     BulkCourseOutcomeSerializer, BulkCourseRequirementSerializer, CourseOutcomeSerializer,CourseRequirementSerializer, 
-    QuizSerializer, QuizListSerializer, 
-    QuizAttemptSerializer, QuizResultSerializer, QuizDashboardSerializer, StudentEnrollmentSerializer
+    QuizSerializer, QuizListSerializer, QuizTakeSerializer, LessonQuizSerializer,
+    QuizAttemptSerializer, QuizResultSerializer, QuizDashboardSerializer, StudentEnrollmentSerializer,
+    Shape, shape_prefetches, COURSE_RELATIONS, LESSON_RELATIONS
 )
 import json
+from collections import defaultdict
 import random
 import logging
 logger = logging.getLogger(__name__)
@@ -188,23 +208,28 @@ class InstructorProgressOverviewView(APIView):
         if course_id:
             courses = courses.filter(id=course_id)
         
+        courses = list(courses.values('id', 'title', 'lesson_count'))
+        course_ids = [course['id'] for course in courses]
+        # Completed lessons per (course, student) in one grouped query, counted by the same
+        # course FK as lesson_count so lessons outside any module count on both sides
+        completed_counts = {
+            (row['lesson__course'], row['student']): row['n'] for row in
+            LessonProgress.objects.filter(lesson__course__in=course_ids, completed=True)
+            .values('lesson__course', 'student').annotate(n=Count('id')).order_by()
+        }
+        students = defaultdict(list)
+        for course_pk, student_pk in Enrollment.objects.filter(course__in=course_ids).values_list('course', 'student'):
+            students[course_pk].append(student_pk)
+
         result = []
         for course in courses:
-            total_lessons = Lesson.objects.filter(module__course=course).count()
-            enrollments = Enrollment.objects.filter(course=course).prefetch_related(
-                'student__lesson_progress'
-            )
-            
+            total_lessons = course['lesson_count']
             completed = 0
             in_progress = 0
             incomplete = 0
             
-            for enrollment in enrollments:
-                completed_lessons = LessonProgress.objects.filter(
-                    student=enrollment.student,
-                    lesson__module__course=course,
-                    completed=True
-                ).count()
+            for student_pk in students[course['id']]:
+                completed_lessons = completed_counts.get((course['id'], student_pk), 0)
                 progress_percent = (
                     (completed_lessons / total_lessons * 100) if total_lessons else 0
                 )
@@ -217,8 +242,8 @@ class InstructorProgressOverviewView(APIView):
                     incomplete += 1
             
             result.append({
-                'course_id': course.id,
-                'course_title': course.title,
+                'course_id': course['id'],
+                'course_title': course['title'],
                 'completed': completed,
                 'in_progress': in_progress,
                 'incomplete': incomplete
@@ -262,7 +287,7 @@ class UserDashboardView(APIView):
         courses = Course.objects.filter(
             enrollments__student=user
         ).select_related('instructor').prefetch_related(
-            Prefetch('modules', queryset=CourseModule.objects.prefetch_related('lessons'))
+            *shape_prefetches(Shape.from_request(request), COURSE_RELATIONS)
         ).distinct()
 
         quizzes = Quiz.objects.filter(
@@ -274,8 +299,16 @@ class UserDashboardView(APIView):
             lesson__module__course__enrollments__student=user
         ).select_related('lesson')
 
-        course_data = CourseSerializer(courses, many=True, context={'request': request}).data
-        quiz_data = QuizDashboardSerializer(quizzes, many=True, context={'request': request}).data
+        completed_counts = dict(
+            LessonProgress.objects.filter(student=user, completed=True)
+            .values('lesson__course').annotate(n=Count('id')).values_list('lesson__course', 'n')
+        )
+        course_data = CourseSerializer(
+            courses, many=True, context={'request': request, 'completed_counts': completed_counts}
+        ).data
+        quiz_data = QuizDashboardSerializer(
+            quizzes, many=True, context={'request': request, 'attempt_counts': attempts_taken(user, quizzes)}
+        ).data
         lesson_progress_data = [
             {
                 'lesson_id': progress.lesson.id,
@@ -298,20 +331,33 @@ class StudentDetailView(generics.RetrieveAPIView):
 
     def get_object(self):
         student_id = self.kwargs.get('id')
-        enrollment = get_object_or_404(Enrollment, id=student_id, course__instructor=self.request.user)
+        enrollment = get_object_or_404(
+            with_completed_counts(Enrollment.objects.select_related('student', 'course')),
+            id=student_id, course__instructor=self.request.user
+        )
         return enrollment
 
 
+def with_completed_counts(enrollments):
+    """Annotate each enrollment with its student's completed lessons in that course"""
+    return enrollments.annotate(completed_count=Coalesce(Subquery(
+        LessonProgress.objects.filter(
+            student=OuterRef('student'), lesson__course=OuterRef('course'), completed=True
+        ).order_by().values('student').annotate(n=Count('id')).values('n')
+    ), 0))
+
+
 class StudentListView(generics.ListAPIView):
     permission_classes = [permissions.IsAuthenticated]
     serializer_class = StudentEnrollmentSerializer
+    pagination_class = EnrolledAtCursorPagination
 
     def get_queryset(self):
         course_id = self.kwargs.get('course_id')
         course = get_object_or_404(Course, id=course_id, instructor=self.request.user)
-        return Enrollment.objects.filter(
+        return with_completed_counts(Enrollment.objects.filter(
             course=course
-        ).select_related('student')
+        ).select_related('student', 'course'))
 
     def get(self, request, *args, **kwargs):
         course_id = kwargs.get('course_id')
@@ -321,22 +367,57 @@ class StudentListView(generics.ListAPIView):
     
 
 # Course Views
+def catalog_queryset():
+    # One query for the whole catalog: instructor joined, lesson stats read from the stored counters
+    return Course.objects.filter(is_published=True).select_related('instructor')
+
 class PublicCourseListView(generics.ListAPIView):
-    queryset = Course.objects.filter(is_published=True)
-    serializer_class = CourseSerializer
+    """Published catalog with ?category/price/duration/rating/instructor filters and facet counts"""
+    serializer_class = CourseCatalogSerializer
     permission_classes = [permissions.AllowAny]
+    pagination_class = CreatedAtCursorPagination
+
+    def get_queryset(self):
+        self.catalog_filter = CourseCatalogFilter(self.request.query_params)
+        return self.catalog_filter.apply(catalog_queryset())
+
+    def list(self, request, *args, **kwargs):
+        response = super().list(request, *args, **kwargs)
+        response.data['facets'] = self.catalog_filter.facet_counts(Course.objects.filter(is_published=True))
+        return response
 
     def get(self, request, *args, **kwargs):
         response = super().get(request, *args, **kwargs)
         print(f"Public GET request to {request.path} by {request.user}")
         return response
 
+class CourseSearchView(generics.ListAPIView):
+    """Ranked full-text search over published courses (?q=...&limit=...)"""
+    serializer_class = CourseCatalogSerializer
+    permission_classes = [permissions.AllowAny]
+    pagination_class = None  # Results are ordered by rank, capped by `limit`
+
+    def get_queryset(self):
+        query = self.request.query_params.get('q', '').strip()
+        try:
+            limit = min(max(int(self.request.query_params.get('limit', 20)), 1), 50)
+        except ValueError:
+            limit = 20
+        if not query:
+            return []
+        ranked_ids = search_course_ids(query, limit)
+        courses = {course.id: course for course in catalog_queryset().filter(id__in=ranked_ids)}
+        return [courses[course_id] for course_id in ranked_ids if course_id in courses]
+
 class InstructorCourseListView(generics.ListCreateAPIView):
     serializer_class = CourseSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = CreatedAtCursorPagination
 
     def get_queryset(self):
-        return Course.objects.filter(instructor=self.request.user)
+        return Course.objects.filter(instructor=self.request.user).select_related('instructor').prefetch_related(
+            *shape_prefetches(Shape.from_request(self.request), COURSE_RELATIONS)
+        )
 
     def perform_create(self, serializer):
         serializer.save(instructor=self.request.user)  # Automatically set instructor
@@ -355,22 +436,66 @@ class InstructorCourseListView(generics.ListCreateAPIView):
         return response
     
 class PublicCourseDetailView(generics.RetrieveAPIView):
-    queryset = Course.objects.all()
+    queryset = Course.objects.select_related('instructor')
     serializer_class = CourseDetailSerializer
     permission_classes = [permissions.AllowAny]  # No login needed
 
     def get(self, request, *args, **kwargs):
-        response = super().get(request, *args, **kwargs)
-        print(f"Public GET course detail {request.path} by {request.user}")
-        print(f"Response: {response.data}")
-        return response
+        course_id = kwargs['pk']
+        # One lookup covers both paths: published courses are served straight from their snapshot
+        meta = Course.objects.filter(pk=course_id).values(
+            'is_published', 'content_version', 'content_updated_at', 'snapshot__content_version',
+            'snapshot__document', 'snapshot__content_hash', 'snapshot__compiled_at'
+        ).first()
+        if meta is None:
+            raise NotFound("Course not found")
+        if meta['is_published']:
+            if meta['snapshot__content_version'] == meta['content_version']:
+                document, content_hash, compiled_at = (
+                    meta['snapshot__document'], meta['snapshot__content_hash'], meta['snapshot__compiled_at']
+                )
+            else:
+                # Missing, or compiled before the course's latest edit
+                snapshot = compile_snapshot(course_id)
+                document, content_hash, compiled_at = snapshot.document, snapshot.content_hash, snapshot.compiled_at
+            etag_parts, last_modified = ['published', course_id, content_hash[:16]], compiled_at
+        else:
+            # Drafts are built from the live tables
+            document = None
+            etag_parts, last_modified = ['course', course_id, meta['content_version']], meta['content_updated_at']
+        # The tree is shared by everyone; signed-in users get their quiz attempts overlaid,
+        # so their ETag covers those too
+        signed_in = request.user.is_authenticated
+        if signed_in:
+            taken, fingerprint = course_attempts(request.user, course_id)
+            etag_parts += [request.user.id, *fingerprint]
+        etag = make_etag(*etag_parts)
+        cached = not_modified(request, etag, last_modified)
+        if cached is not None:
+            return cached
+        if document is None:
+            # Shaped like the snapshot: relative file urls and no answer keys
+            document = get_cached_course_tree(
+                course_id, meta['content_version'], 'public:no-answers',
+                lambda: build_course_tree(self.get_object(), CourseDetailSerializer, answers=False)
+            )
+        if signed_in:
+            document = overlay_course_quiz_attempts(document, request.user, taken)
+        logger.info(f"Public GET course detail {request.path} by {request.user}")
+        return set_validators(Response(document), etag, last_modified, private=signed_in)
     
 class InstructorCourseDetailView(generics.RetrieveUpdateDestroyAPIView):
     serializer_class = CourseSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        return Course.objects.filter(instructor=self.request.user)
+        return Course.objects.filter(instructor=self.request.user).select_related('instructor')
+
+    def retrieve(self, request, *args, **kwargs):
+        return Response(build_course_tree(
+            self.get_object(), CourseSerializer, Shape.from_request(request),
+            user=request.user, context=self.get_serializer_context()
+        ))
 
     def get(self, request, *args, **kwargs):
         response = super().get(request, *args, **kwargs)
@@ -387,6 +512,67 @@ class InstructorCourseDetailView(generics.RetrieveUpdateDestroyAPIView):
         print(f"Instructor DELETE {request.path} by {request.user}")
         return response
 
+class CourseExportView(APIView):
+    """Stream one of the instructor's courses as a JSON lines bundle (see bundle.py)"""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, pk):
+        if not Course.objects.filter(pk=pk, instructor=request.user).exists():
+            raise NotFound("Course not found")
+        response = StreamingHttpResponse(export_course(pk), content_type='application/x-ndjson')
+        response['Content-Disposition'] = f'attachment; filename="course-{pk}.jsonl"'
+        logger.info(f"Instructor export of course {pk} by {request.user}")
+        return response
+
+
+class CourseImportView(APIView):
+    """Create a new unpublished course from an uploaded bundle (multipart field `bundle`)"""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        bundle = request.FILES.get('bundle')
+        if bundle is None:
+            return Response({"detail": "Upload the bundle file as 'bundle'"}, status=status.HTTP_400_BAD_REQUEST)
+        course = import_course(bundle, request.user)
+        logger.info(f"Instructor import of course {course.pk} by {request.user}")
+        return Response(CourseSerializer(course, context={'request': request}).data, status=status.HTTP_201_CREATED)
+
+
+class CourseDuplicateView(APIView):
+    """Copy one of the instructor's courses (e.g. for a new cohort). Optional body: {"title": ...}"""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request, pk):
+        if not Course.objects.filter(pk=pk, instructor=request.user).exists():
+            raise NotFound("Course not found")
+        title = request.data.get('title') or None
+        course = clone_course(pk, request.user, title=title)
+        logger.info(f"Instructor duplicated course {pk} as {course.pk} by {request.user}")
+        return Response(CourseSerializer(course, context={'request': request}).data, status=status.HTTP_201_CREATED)
+
+
+class CoursePublishView(APIView):
+    """Publish one of the instructor's courses, or recompile the public snapshot of a published one"""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request, pk):
+        course = get_object_or_404(Course, pk=pk, instructor=request.user)
+        if course.is_published:
+            snapshot = compile_snapshot(course.pk)
+            on_publish(course.pk)
+        else:
+            course.is_published = True
+            course.save()
+            snapshot = current_snapshot(course.pk)
+        logger.info(f"Instructor published course {pk} by {request.user}")
+        return Response({
+            'course': course.pk,
+            'content_version': snapshot.content_version,
+            'content_hash': snapshot.content_hash,
+            'compiled_at': snapshot.compiled_at,
+        })
+
+
 class BulkCourseOutcomeView(APIView):
     permission_classes = [permissions.IsAuthenticated, IsCourseInstructor]
 
@@ -523,14 +709,30 @@ class CourseSpecificLessons(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get(self, request, id, format=None):
-        lessons = Lesson.objects.filter(course=id)
-        serializer = LessonSerializer(lessons, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        meta = Course.objects.filter(pk=id).values('content_version', 'content_updated_at').first()
+        if meta is None:
+            return Response([], status=status.HTTP_200_OK)
+        etag = make_etag('lessons', id, meta['content_version'])
+        cached = not_modified(request, etag, meta['content_updated_at'])
+        if cached is not None:
+            return cached
+        shape = Shape.from_request(request)
+        data = get_cached_course_tree(
+            id, meta['content_version'], f"lessons:{shape.key if shape else 'full'}",
+            lambda: LessonSerializer(
+                Lesson.objects.filter(course=id).prefetch_related(*shape_prefetches(shape, LESSON_RELATIONS)),
+                many=True, context={'shape': shape}
+            ).data
+        )
+        return set_validators(Response(data, status=status.HTTP_200_OK), etag, meta['content_updated_at'])
 
 class LessonListCreateView(generics.ListCreateAPIView):
-    queryset = Lesson.objects.all()
     serializer_class = LessonSerializer
     permission_classes = [permissions.AllowAny]
+    pagination_class = IdCursorPagination
+
+    def get_queryset(self):
+        return Lesson.objects.prefetch_related(*shape_prefetches(Shape.from_request(self.request), LESSON_RELATIONS))
 
     def get(self, request, *args, **kwargs):
         response = super().get(request, *args, **kwargs)
@@ -545,10 +747,12 @@ class LessonListCreateView(generics.ListCreateAPIView):
         return response
 
 class LessonDetailView(generics.RetrieveUpdateDestroyAPIView):
-    queryset = Lesson.objects.all()
     serializer_class = LessonSerializer
     permission_classes = [permissions.IsAuthenticated] 
 
+    def get_queryset(self):
+        return Lesson.objects.prefetch_related(*shape_prefetches(Shape.from_request(self.request), LESSON_RELATIONS))
+
     def get(self, request, *args, **kwargs):
         response = super().get(request, *args, **kwargs)
         print(f"GET request to {request.path} by {request.user}")
@@ -568,6 +772,8 @@ class LessonDetailView(generics.RetrieveUpdateDestroyAPIView):
     
     def perform_update(self, serializer):
         serializer.save()
+        # Drop relations prefetched by get_queryset so the response shows the new rows
+        serializer.instance._prefetched_objects_cache = {}
 
     # def put(self, request, *args, **kwargs):
     #     response = super().put(request, *args, **kwargs)
@@ -694,6 +900,7 @@ class ModuleDetailView(generics.RetrieveUpdateDestroyAPIView):
 class QuizListCreateView(generics.ListCreateAPIView):
     serializer_class = QuizListSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = CreatedAtCursorPagination
 
     def get_queryset(self):
         # Filter by lesson if provided
@@ -735,6 +942,26 @@ class QuestionListCreateView(generics.ListCreateAPIView):
         except Quiz.DoesNotExist:
             raise NotFound("Quiz not found")
 
+class QuestionImportView(APIView):
+    """
+    Add a question bank to one of the instructor's quizzes: a CSV, JSON or GIFT
+    upload (multipart field `file`, optional `format`), or a JSON body {"questions": [...]}
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, quiz_id):
+        quiz = get_object_or_404(Quiz, pk=quiz_id, course__instructor=request.user)
+        upload = request.FILES.get('file')
+        if upload is not None:
+            rows = parse_questions(upload.read(), request.data.get('format') or guess_format(upload.name))
+        elif isinstance(request.data.get('questions'), list):
+            rows = parse_questions(json.dumps(request.data['questions']), 'json')
+        else:
+            return Response({"detail": "Upload the question bank as 'file' or send a 'questions' list"}, status=status.HTTP_400_BAD_REQUEST)
+        created = import_questions(quiz, rows)
+        logger.info(f"Imported {len(created)} questions into quiz {quiz.pk} by {request.user}")
+        return Response({'created': len(created)}, status=status.HTTP_201_CREATED)
+
 class QuestionDetailView(generics.RetrieveUpdateDestroyAPIView):
     queryset = Question.objects.all()
     serializer_class = QuestionSerializer
@@ -750,39 +977,47 @@ class LessonQuizzesView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get(self, request, lesson_id):
+        # Outside the try, so a missing lesson stays a 404
+        lesson = get_object_or_404(Lesson, id=lesson_id)
         try:
-            lesson = get_object_or_404(Lesson, id=lesson_id)
-            
             # Check if user is enrolled in the course
-            is_enrolled = lesson.course.enrollments.filter(student=request.user).exists()
+            is_enrolled = Enrollment.objects.filter(student=request.user, course_id=lesson.course_id).exists()
             if not is_enrolled:
                 return Response(
                     {"detail": "You are not enrolled in this course."}, 
                     status=status.HTTP_403_FORBIDDEN
                 )
 
-            # Get active quizzes for this lesson
-            quizzes = Quiz.objects.filter(lesson_id=lesson_id, is_active=True)
+            # Active quizzes for this lesson with the question count and the user's attempt
+            # summary (and its last attempt) joined in, so this is one query however many quizzes
+            last_attempt_fields = ['id', 'score', 'total_points', 'earned_points', 'passed', 'completed_at', 'time_taken']
+            quizzes = (
+                Quiz.objects.filter(lesson_id=lesson_id, is_active=True)
+                .select_related('lesson')
+                .annotate(
+                    mine=FilteredRelation('attempt_summaries', condition=Q(attempt_summaries__student=request.user)),
+                    question_total=Count('questions'),
+                    attempts_taken=Coalesce(F('mine__attempts_count'), 0),
+                    best_score=F('mine__best_score'),
+                    any_passed=F('mine__passed'),
+                    **{f'last_{name}': F(f'mine__last_attempt__{name}') for name in last_attempt_fields},
+                )
+            )
             
-            # Add attempt information for each quiz
             quiz_data = []
             for quiz in quizzes:
-                # Get user's attempts for this quiz
-                attempts = QuizAttempt.objects.filter(
-                    student=request.user, 
-                    quiz=quiz
-                ).order_by('-started_at')
-                
-                quiz_info = QuizListSerializer(quiz).data
-                quiz_info['attempts_count'] = attempts.count()
+                quiz_info = LessonQuizSerializer(quiz).data
+                quiz_info['attempts_count'] = quiz.attempts_taken
                 quiz_info['max_attempts'] = quiz.max_attempts
-                quiz_info['can_attempt'] = attempts.count() < quiz.max_attempts
+                quiz_info['can_attempt'] = quiz.attempts_taken < quiz.max_attempts
                 
-                if attempts.exists():
-                    best_attempt = attempts.order_by('-score').first()
-                    quiz_info['best_score'] = best_attempt.score
-                    quiz_info['passed'] = best_attempt.passed
-                    quiz_info['last_attempt'] = QuizResultSerializer(attempts.first()).data
+                if quiz.last_id is not None:
+                    last_attempt = QuizAttempt(
+                        quiz=quiz, **{name: getattr(quiz, f'last_{name}') for name in last_attempt_fields}
+                    )
+                    quiz_info['best_score'] = quiz.best_score
+                    quiz_info['passed'] = quiz.any_passed
+                    quiz_info['last_attempt'] = QuizResultSerializer(last_attempt).data
                 else:
                     quiz_info['best_score'] = None
                     quiz_info['passed'] = False
@@ -809,14 +1044,26 @@ class QuizTakeView(APIView):
         user = request.user
         try:
             quiz = Quiz.objects.get(id=quiz_id)
-            attempt_count = QuizAttempt.objects.filter(student=user, quiz=quiz).count()
+            attempt_count = attempts_taken(user, [quiz.pk]).get(quiz.pk, 0)
             if quiz.max_attempts and attempt_count >= quiz.max_attempts:
                 logger.warning(f"No attempts remaining for quiz {quiz_id} by user {user}")
                 return Response(
                     {"error": "No attempts remaining"},
                     status=status.HTTP_403_FORBIDDEN
                 )
-            quiz_data = QuizSerializer(quiz, context={'request': request}).data
+            # The payload is the same for every student, so it's built once per quiz version
+            quiz_data = get_cached_quiz_build(
+                quiz, 'take',
+                lambda: QuizTakeSerializer(Quiz.objects.prefetch_related('questions').get(pk=quiz.pk)).data
+            )
+            # Quizzes with pools or shuffling get this student's paper for their next attempt,
+            # cut from the shared payload
+            paper = build_paper(quiz, user.pk, attempt_count + 1)
+            if paper is not None:
+                quiz_data = paper_payload(quiz_data, paper)
+            quiz_data = {**quiz_data, 'version': quiz.version, **attempt_fields(
+                {'is_active': quiz.is_active, 'max_attempts': quiz.max_attempts}, attempt_count, True
+            )}
             response_data = {"quiz": quiz_data}
             logger.info(f"GET /quizzes/{quiz_id}/take/ by {user} - Success")
             return Response(response_data, status=status.HTTP_200_OK)
@@ -842,71 +1089,73 @@ class QuizSubmitView(APIView):
             if not quiz:
                 return Response({"detail": "Quiz not found"}, status=status.HTTP_404_NOT_FOUND)
 
-            # Check if user can attempt
-            attempts = QuizAttempt.objects.filter(quiz=quiz.id, student=request.user).count()
-            if not quiz.is_active or attempts >= quiz.max_attempts:
-                return Response(
-                    {"detail": "No attempts remaining or quiz is not available"},
-                    status=status.HTTP_403_FORBIDDEN
-                )
+            no_attempts = Response(
+                {"detail": "No attempts remaining or quiz is not available"},
+                status=status.HTTP_403_FORBIDDEN
+            )
+            if not quiz.is_active:
+                return no_attempts
 
             # Get answers
             answers = request.data.get('answers', {})
             time_taken = request.data.get('time_taken', 0)
+            if not isinstance(answers, dict):
+                return Response({"detail": "answers must map question ids to answers"}, status=status.HTTP_400_BAD_REQUEST)
 
-            # Validate answers
-            questions = Question.objects.filter(quiz=quiz)
-            if not questions.exists():
+            # Grade against the quiz's compiled answer key (cached per quiz version, no question queries)
+            answer_key = get_answer_key(quiz)
+            if not answer_key:
                 return Response({"detail": "No questions found"}, status=status.HTTP_400_BAD_REQUEST)
-
-            # Calculate score
-            score = 0
-            total_points = 0
-            correct_answers = 0
-            total_questions = questions.count()
-            detailed_results = {}
-
-            for question in questions:
-                user_answer = answers.get(str(question.id))
-                correct_answer = question.correct_answer
-                if question.question_type == 'multiple_choice_multiple':
-                    correct = isinstance(user_answer, list) and sorted(user_answer) == sorted(json.loads(correct_answer))
-                elif question.question_type == 'short_answer':
-                    correct = user_answer.strip().lower() == correct_answer.strip().lower()
-                else:
-                    correct = user_answer == correct_answer
-
-                if correct:
-                    score += question.points
-                    correct_answers += 1
-
-                total_points += question.points
-                detailed_results[question.id] = {
-                    'question': question.text,
-                    'your_answer': user_answer,
-                    'correct_answer': correct_answer,
-                    'is_correct': correct,
-                    'explanation': question.explanation,
-                }
-
-            # Save attempt
-            QuizAttempt.objects.create(
-                quiz=quiz,
-                student=request.user,
-                score=score,
-                time_taken=time_taken,
-                answers=answers
-            )
+            # The paper is rebuilt from the same seed the take view used, so it must be the same quiz
+            # version. Quizzes with papers require it: any other version grades a different paper
+            version = request.data.get('version')
+            with_papers = uses_papers(quiz)
+            if version is None and with_papers:
+                return Response(
+                    {"detail": "version is required: send the version the quiz was opened at"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            if version is not None and str(version) != str(quiz.version):
+                return Response(
+                    {"detail": "The quiz has changed since it was opened, please reload it"},
+                    status=status.HTTP_409_CONFLICT
+                )
+            paper = None
+            if with_papers:
+                paper = build_paper(quiz, request.user.pk, attempts_taken(request.user, [quiz.pk]).get(quiz.pk, 0) + 1)
+                answer_key = paper_key(answer_key, paper)
+                submitted, answers = answers, to_quiz_answers(answers, paper)
+            graded = grade(answer_key, answers)
+
+            # Save attempt; score is a percentage, like passing_score. The attempt limit is
+            # enforced by a conditional UPDATE of the summary row, so concurrent submits can't
+            # slip past it; an attempt over the limit is rolled back.
+            try:
+                with transaction.atomic():
+                    attempt = QuizAttempt.objects.create(
+                        quiz=quiz,
+                        student=request.user,
+                        score=graded.score,
+                        total_points=graded.total_points,
+                        earned_points=graded.earned_points,
+                        completed_at=timezone.now(),
+                        time_taken=time_taken,
+                        answers=answers
+                    )
+                    attempts = record_attempt(attempt, quiz.max_attempts)
+                    QuizAttemptAnswer.objects.bulk_create(answer_rows(attempt, answer_key, graded))
+            except AttemptLimitReached:
+                return no_attempts
 
             # Response
             result = {
-                'score': (score / total_points * 100) if total_points > 0 else 0,
-                'total_points': total_points,
-                'correct_answers': correct_answers,
-                'total_questions': total_questions,
-                'passed': score >= quiz.passing_score * total_points / 100,
-                'attempts_remaining': max(0, quiz.max_attempts - attempts - 1),
-                'detailed_results': detailed_results
+                'score': graded.earned_points / graded.total_points * 100 if graded.total_points > 0 else 0,
+                'total_points': graded.total_points,
+                'correct_answers': graded.correct_answers,
+                'total_questions': len(answer_key),
+                'passed': attempt.passed,
+                'attempts_remaining': max(0, quiz.max_attempts - attempts),
+                'detailed_results': graded.results if paper is None else shown_results(graded.results, answer_key, paper, submitted)
             }
 
             return Response(result, status=status.HTTP_201_CREATED)
@@ -918,9 +1167,26 @@ class QuizSubmitView(APIView):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+class QuizItemAnalysisView(APIView):
+    """Per-question difficulty, discrimination and answer distributions, for the quiz's instructor"""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, quiz_id):
+        quiz = get_object_or_404(Quiz, pk=quiz_id, course__instructor=request.user)
+        return Response(item_analysis(quiz))
+
+class QuizStatisticsView(APIView):
+    """Attempt, pass rate, score and time-taken statistics, for the quiz's instructor"""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, quiz_id):
+        quiz = get_object_or_404(Quiz, pk=quiz_id, course__instructor=request.user)
+        return Response(quiz_statistics(quiz))
+
 class QuizAttemptListView(generics.ListAPIView):
     serializer_class = QuizAttemptSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = StartedAtCursorPagination
     
     def get_queryset(self):
         quiz_id = self.kwargs.get('quiz_id')
@@ -1094,51 +1360,142 @@ class LessonProgressView(generics.CreateAPIView):
     
 class EnrolledCourseDetailView(APIView):
     permission_classes = [IsAuthenticated]
+    kind = 'enrolled'
+
+    def get_shape(self, request):
+        return Shape.from_request(request)
 
     def get(self, request, course_id):
         try:
-            print(f"DEBUG: Processing request for course {course_id} by user {request.user.id}")
-            enrollment_exists = Enrollment.objects.filter(
-                student=request.user,
-                course_id=course_id
-            ).exists()
-            print(f"DEBUG: User enrolled: {enrollment_exists}")
-            if not enrollment_exists:
+            logger.debug(f"Processing request for course {course_id} by user {request.user.id}")
+            # Enrollment check, content version and progress fingerprint in one query
+            progress = LessonProgress.objects.filter(
+                student=request.user, lesson__course=OuterRef('pk'), completed=True
+            ).values('student')
+            # The student's quiz attempts in the course, so a submitted (or deleted) attempt changes the ETag
+            summaries = QuizAttemptSummary.objects.filter(
+                student=request.user, quiz__course=OuterRef('pk')
+            ).values('student')
+            meta = Course.objects.filter(id=course_id, enrollments__student=request.user).annotate(
+                completed_count=Subquery(progress.annotate(n=Count('id')).values('n')),
+                last_progress_id=Subquery(progress.annotate(m=Max('id')).values('m')),
+                last_completed_at=Subquery(progress.annotate(m=Max('completed_at')).values('m')),
+                attempts_total=Subquery(summaries.annotate(n=Sum('attempts_count')).values('n')),
+                last_attempt_id=Subquery(summaries.annotate(m=Max('last_attempt')).values('m')),
+            ).values('content_version', 'content_updated_at', 'lesson_count', 'completed_count',
+                     'last_progress_id', 'last_completed_at', 'attempts_total', 'last_attempt_id').first()
+            logger.debug(f"User enrolled: {meta is not None}")
+            if meta is None:
                 return Response(
                     {"detail": "Course not found or you're not enrolled in this course"},
                     status=status.HTTP_404_NOT_FOUND
                 )
-            course = Course.objects.filter(id=course_id).prefetch_related(
-                Prefetch('modules', queryset=CourseModule.objects.prefetch_related(
-                    Prefetch('lessons', queryset=Lesson.objects.prefetch_related('contents', 'quizzes', 'assignments', 'resources'))
-                ))
-            ).first()
-            print(f"DEBUG: Course found: {course is not None}")
-            if not course:
+            etag = make_etag(
+                self.kind, course_id, meta['content_version'], request.user.id,
+                meta['completed_count'] or 0, meta['last_progress_id'] or 0,
+                meta['attempts_total'] or 0, meta['last_attempt_id'] or 0
+            )
+            last_modified = max(filter(None, [meta['content_updated_at'], meta['last_completed_at']]))
+            cached = not_modified(request, etag, last_modified)
+            if cached is not None:
+                return cached
+            shape = self.get_shape(request)
+            course_data = get_cached_course_tree(
+                course_id, meta['content_version'], f"{self.kind}:{shape.key if shape else 'full'}",
+                lambda: self.build_course(course_id, shape)
+            )
+            logger.debug(f"Course found: {course_data is not None}")
+            if not course_data:
                 return Response({"detail": "Course not found"}, status=status.HTTP_404_NOT_FOUND)
             completed_lessons = set(
                 LessonProgress.objects.filter(
                     student=request.user,
-                    lesson__course=course,
+                    lesson__course_id=course_id,
                     completed=True
                 ).values_list('lesson_id', flat=True)
             )
-            print(f"DEBUG: Found {len(completed_lessons)} completed lessons")
-            serializer = CourseSerializer(
-                course,
-                context={'request': request, 'completed_lessons': completed_lessons}
+            logger.debug(f"Found {len(completed_lessons)} completed lessons")
+            logger.debug(f"Successfully built response for course {course_id}")
+            return set_validators(
+                Response(overlay_course_quiz_attempts(
+                    self.overlay_progress(course_data, completed_lessons, meta['lesson_count']), request.user
+                )),
+                etag, last_modified, private=True
             )
-            print(f"DEBUG: Successfully built response for course {course_id}")
-            return Response(serializer.data)
         except Exception as e:
-            import traceback
-            print(f"ERROR: Exception in EnrolledCourseDetailView: {str(e)}")
-            traceback.print_exc()
+            logger.exception(f"Exception in EnrolledCourseDetailView: {str(e)}")
             return Response(
                 {"detail": "An error occurred while fetching the course"},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+    def build_course(self, course_id, shape):
+        """Shared, user-independent part of the response; per-user fields are overlaid later"""
+        course = Course.objects.filter(id=course_id).select_related('instructor').first()
+        return build_course_tree(course, CourseSerializer, shape) if course else {}
+
+    def overlay_progress(self, course_data, completed_lessons, total_lessons):
+        data = dict(course_data)
+        if 'completed_lessons' in data:
+            data['completed_lessons'] = list(completed_lessons)
+        if 'progress_percent' in data:
+            data['progress_percent'] = (
+                round(len(completed_lessons) / total_lessons * 100) if total_lessons else 0
+            )
+        return data
+
+
+class EnrolledCourseOutlineView(EnrolledCourseDetailView):
+    """
+    Module and lesson skeleton with completion flags, for first render of the course player.
+    Lesson bodies, resources and quizzes come from EnrolledLessonContentView when opened.
+    """
+    kind = 'outline'
+    shape = Shape(fields=[
+        'id', 'title', 'duration', 'total_lessons', 'progress_percent',
+        'modules.id', 'modules.title', 'modules.position', 'modules.duration',
+        'modules.lessons.id', 'modules.lessons.title', 'modules.lessons.position', 'modules.lessons.duration',
+    ])
+
+    def get_shape(self, request):
+        return self.shape
+
+    def overlay_progress(self, course_data, completed_lessons, total_lessons):
+        data = super().overlay_progress(course_data, completed_lessons, total_lessons)
+        data['modules'] = [
+            {**module, 'lessons': [
+                {**lesson, 'completed': lesson['id'] in completed_lessons} for lesson in module['lessons']
+            ]}
+            for module in data['modules']
+        ]
+        return data
+
+
+class EnrolledLessonContentView(APIView):
+    """Contents, resources, assignments and quiz summaries of one lesson, loaded when it's opened"""
+    permission_classes = [IsAuthenticated]
+    shape = Shape(expand=['contents', 'resources', 'assignments', 'quizzes'])
+
+    def get(self, request, lesson_id):
+        meta = Lesson.objects.filter(id=lesson_id, course__enrollments__student=request.user).values(
+            'course_id', 'course__content_version'
+        ).first()
+        if meta is None:
+            return Response(
+                {"detail": "Lesson not found or you're not enrolled in this course"},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        # Quiz questions stay out; QuizTakeView serves them when an attempt starts
+        lesson = get_cached_course_tree(
+            meta['course_id'], meta['course__content_version'], f'lesson:{lesson_id}',
+            lambda: build_lesson_tree(lesson_id, self.shape, context={'request': request})
+        )
+        data = overlay_quiz_attempts(lesson, request.user)
+        data['completed'] = LessonProgress.objects.filter(
+            student=request.user, lesson_id=lesson_id, completed=True
+        ).exists()
+        return Response(data)
+
 class ResourceDetailView(generics.RetrieveUpdateDestroyAPIView):
     queryset = Resource.objects.all()
     serializer_class = ResourceSerializer
@@ -1183,9 +1540,7 @@ class EnrollmentProgressView(APIView):
             if not enrollment:
                 return Response({"detail": "Not enrolled in this course"}, status=404)
                 
-            # Get lessons for this course
-            lessons = Lesson.objects.filter(course_id=course_id)
-            total_lessons = lessons.count()
+            total_lessons = Course.objects.filter(id=course_id).values_list('lesson_count', flat=True).first() or 0
             
             # Get completed lessons
             completed_lessons = LessonProgress.objects.filter(
@@ -1233,11 +1588,12 @@ class CompleteLessonView(APIView):
         progress, created = LessonProgress.objects.get_or_create(
             student=request.user,
             lesson_id=lesson_id,
-            defaults={'completed': True}
+            defaults={'completed': True, 'completed_at': timezone.now()}
         )
         
-        if not created:
+        if not created and not progress.completed:
             progress.completed = True
+            progress.completed_at = timezone.now()
             progress.save()
             
         return Response({
@@ -1308,17 +1664,33 @@ class ModuleReorderView(APIView):
     permission_classes = [IsAuthenticated]
 
     def post(self, request):
-        try:
+        ids = request.data.get('ids')
+        if ids is None:
+            # Older clients send [{"id": .., "position": ..}, ...], possibly for just the modules they moved
             module_positions = request.data.get('modules', [])
-            with transaction.atomic():
-                for item in module_positions:
-                    module_id = item.get('id')
-                    position = item.get('position')
-                    module = CourseModule.objects.get(id=module_id, course__instructor=request.user)
-                    module.position = position
-                    module.save()
-            return Response({"detail": "Module order updated"}, status=status.HTTP_200_OK)
-        except CourseModule.DoesNotExist:
-            return Response({"detail": "Module not found or unauthorized"}, status=status.HTTP_403_FORBIDDEN)
-        except Exception as e:
-            return Response({"detail": f"Error updating module order: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
\ No newline at end of file
+            if not isinstance(module_positions, list) or not all(
+                isinstance(item, dict) and isinstance(item.get('position') or 0, int) for item in module_positions
+            ):
+                return Response(
+                    {"detail": "modules must be a list of {id, position} objects"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            if not module_positions:
+                return Response({"detail": "Module order updated"}, status=status.HTTP_200_OK)
+            listed = [item.get('id') for item in sorted(module_positions, key=lambda item: item.get('position') or 0)]
+            ids = merged_order('modules', listed)
+        reorder('modules', ids, request.user)
+        return Response({"detail": "Module order updated"}, status=status.HTTP_200_OK)
+
+
+class ReorderView(APIView):
+    """POST {"ids": [...]} listing every sibling lesson/content/resource in the new order"""
+    permission_classes = [IsAuthenticated]
+    kind = None
+
+    def post(self, request):
+        ids = request.data.get('ids')
+        if not isinstance(ids, list):
+            return Response({"detail": "ids must be a list"}, status=status.HTTP_400_BAD_REQUEST)
+        updated = reorder(self.kind, ids, request.user)
+        return Response({"detail": f"{self.kind.capitalize()} order updated", "updated": updated}, status=status.HTTP_200_OK)
\ No newline at end of file
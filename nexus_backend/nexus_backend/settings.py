@@ -141,6 +141,15 @@ DATABASES = {
     }
 }
 
+# Course trees are cached per content version (see courses/caching.py).
+# Point this at a shared backend such as Redis when running several workers.
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "nexus-academy",
+    }
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -179,6 +188,11 @@ USE_TZ = True
 STATIC_URL = "static/"
 
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles') 
+
+# Pre-rendered, gzipped catalog JSON for nginx/a CDN to serve (see courses/static_catalog.py)
+STATIC_CATALOG_ROOT = os.path.join(BASE_DIR, 'catalog')
+# Refresh a course's static files whenever it is published, republished or unpublished
+STATIC_CATALOG_ON_PUBLISH = os.getenv("STATIC_CATALOG_ON_PUBLISH") == "1"
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 